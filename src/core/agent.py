@@ -3,13 +3,25 @@ Main agent module for the Databricks Insight Agent.
 Orchestrates query understanding, SQL generation, context retrieval, and response generation.
 """
 
+import asyncio
 import logging
-from typing import Optional, Dict, Any, List
-from dataclasses import dataclass
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Dict, Any, List, Tuple, Callable
+from dataclasses import dataclass, replace
 from enum import Enum
 
 logger = logging.getLogger(__name__)
 
+# Most questions marshalled into one batched SQL prompt; larger batches
+# make the single reply slow enough to cancel out the saved round trips
+BATCH_MAX = 4
+
+# How long the first pending question waits for others to join its batch
+BATCH_WINDOW_MS = 50
+
 
 class QueryType(Enum):
     """Types of queries the agent can handle."""
@@ -19,6 +31,14 @@ class QueryType(Enum):
     CLARIFICATION = "clarification"  # Need more information
 
 
+class ProcessingStage(Enum):
+    """Pipeline stages reported to a process_query progress callback."""
+    ANALYZING = "analyzing"  # Validation, intent analysis, context retrieval
+    GENERATING_SQL = "generating_sql"
+    EXECUTING = "executing"  # Running the SQL on Databricks
+    SUMMARIZING = "summarizing"  # Generating insights
+
+
 @dataclass
 class QueryAnalysis:
     """Analysis of user query."""
@@ -43,6 +63,150 @@ class AgentResponse:
     error: Optional[str]
 
 
+def _ignore_progress(stage: ProcessingStage):
+    """Default progress callback."""
+
+
+def _copy_response(response: AgentResponse) -> AgentResponse:
+    """Copy a response down to its result rows, which callers may mutate."""
+    if response.results is None:
+        return replace(response)
+    return replace(response, results=[dict(row) for row in response.results])
+
+
+class QueryBatcher:
+    """
+    Coalesces SQL generation requests that arrive close together.
+    
+    Questions submitted within BATCH_WINDOW_MS of each other, up to
+    BATCH_MAX of them, share one Mistral call whose prompt numbers them and
+    whose reply is split back per question. Only one user's questions
+    (e.g. several tabs of one Streamlit session) are ever batched
+    together, so text in one user's question can't steer the SQL generated
+    for another. A question arriving while that user has nothing else
+    pending or running is sent at once, so it never waits out the window.
+    """
+    
+    def __init__(
+        self,
+        llm_service,
+        max_batch: int = BATCH_MAX,
+        window_ms: int = BATCH_WINDOW_MS
+    ):
+        """
+        Initialize the batcher.
+        
+        Args:
+            llm_service: LLM service providing generate_sql_for_questions
+            max_batch: Flush as soon as this many questions are pending
+            window_ms: Flush this long after the first pending question
+        """
+        self.llm_service = llm_service
+        self.max_batch = max_batch
+        self.window_seconds = window_ms / 1000
+        self._lock = threading.Lock()
+        # Per user id: questions waiting for a batch, the timer that will
+        # flush them, and batches whose Mistral call hasn't returned yet
+        self._pending: Dict[str, List[Tuple[str, str, Optional[str], Future]]] = {}
+        self._timers: Dict[str, threading.Timer] = {}
+        self._running: Dict[str, int] = {}
+    
+    def submit(
+        self,
+        user_query: str,
+        schema_info: str,
+        context: Optional[str] = None,
+        user_id: str = "default"
+    ) -> Future:
+        """
+        Queue a question for batched SQL generation.
+        
+        Args:
+            user_query: User's natural language query
+            schema_info: Database schema information
+            context: Additional context from knowledge base
+            user_id: Owner of the question; only questions with the same
+                owner share a batch
+            
+        Returns:
+            Future resolving to the generated SQL, or None if generation failed
+        """
+        future: Future = Future()
+        with self._lock:
+            pending = self._pending.setdefault(user_id, [])
+            pending.append((user_query, schema_info, context, future))
+            if len(pending) >= self.max_batch or (len(pending) == 1 and not self._running.get(user_id)):
+                batch = self._take_pending(user_id)
+            else:
+                batch = None
+                if user_id not in self._timers:
+                    timer = threading.Timer(self.window_seconds, self._flush, args=(user_id,))
+                    timer.daemon = True
+                    self._timers[user_id] = timer
+                    timer.start()
+        
+        # A full or lone batch is sent from the submitting thread, which
+        # would otherwise just wait on its future
+        if batch:
+            self._run_batch(user_id, batch)
+        return future
+    
+    def _take_pending(self, user_id: str) -> List[Tuple[str, str, Optional[str], Future]]:
+        """Detach a user's pending questions; caller holds the lock and must run them."""
+        batch = self._pending.pop(user_id, [])
+        timer = self._timers.pop(user_id, None)
+        if timer is not None:
+            timer.cancel()
+        if batch:
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+        return batch
+    
+    def _flush(self, user_id: str):
+        """Send a user's pending questions when their batching window closes."""
+        with self._lock:
+            batch = self._take_pending(user_id)
+        if batch:
+            self._run_batch(user_id, batch)
+    
+    def _run_batch(self, user_id: str, batch: List[Tuple[str, str, Optional[str], Future]]):
+        """Generate SQL for a batch and resolve each question's future."""
+        try:
+            self._generate_batch(batch)
+        finally:
+            with self._lock:
+                self._running[user_id] -= 1
+                if not self._running[user_id]:
+                    del self._running[user_id]
+    
+    def _generate_batch(self, batch: List[Tuple[str, str, Optional[str], Future]]):
+        """Resolve each question's future, grouping questions by schema."""
+        # Questions can only share a prompt when they see the same schema
+        groups: Dict[str, List[Tuple[str, Optional[str], Future]]] = {}
+        for user_query, schema_info, context, future in batch:
+            groups.setdefault(schema_info, []).append((user_query, context, future))
+        
+        for schema_info, items in groups.items():
+            try:
+                sqls = self.llm_service.generate_sql_for_questions(
+                    [(user_query, context) for user_query, context, _ in items],
+                    schema_info
+                )
+            except Exception as e:
+                for _, _, future in items:
+                    future.set_exception(e)
+                continue
+            
+            for (user_query, context, future), sql in zip(items, sqls):
+                if sql is None and len(items) > 1:
+                    # The batched reply skipped this question; ask on its own
+                    try:
+                        sql = self.llm_service.generate_sql_from_query(user_query, schema_info, context)
+                    except Exception as e:
+                        future.set_exception(e)
+                        continue
+                future.set_result(sql)
+
+
 class DatabricksInsightAgent:
     """
     AI Analytics Assistant for Databricks Lakehouse.
@@ -59,7 +223,10 @@ class DatabricksInsightAgent:
         context_retriever,
         security_validator,
         rate_limiter=None,
-        llm_service=None
+        llm_service=None,
+        query_batcher=None,
+        response_cache_size: int = 128,
+        response_cache_ttl: float = 600.0
     ):
         """
         Initialize the Databricks Insight Agent.
@@ -72,6 +239,11 @@ class DatabricksInsightAgent:
             security_validator: Security validation
             rate_limiter: Rate limiter for API calls (optional)
             llm_service: LLM service for enhanced query understanding (optional)
+            query_batcher: QueryBatcher that coalesces LLM SQL generation
+                across concurrent queries (optional)
+            response_cache_size: Successful responses kept for repeated
+                questions (0 disables the cache)
+            response_cache_ttl: Seconds a cached response stays valid
         """
         self.databricks_client = databricks_client
         self.schema_manager = schema_manager
@@ -80,25 +252,183 @@ class DatabricksInsightAgent:
         self.security_validator = security_validator
         self.rate_limiter = rate_limiter
         self.llm_service = llm_service
+        self.query_batcher = query_batcher
+        self.response_cache_size = response_cache_size
+        self.response_cache_ttl = response_cache_ttl
+        # Kept on the agent rather than behind st.cache_data in the UI: a
+        # cached Streamlit function can't replay writes to the st.status
+        # block the progress callback updates, and the CLI benefits as well
+        self._response_cache: "OrderedDict[Tuple[int, str, str], Tuple[float, AgentResponse]]" = OrderedDict()
+        self._response_cache_lock = threading.Lock()
     
-    def process_query(self, user_query: str, user_id: str = "default") -> AgentResponse:
+    def process_query(
+        self,
+        user_query: str,
+        user_id: str = "default",
+        skip_rate_limit: bool = False,
+        on_progress: Optional[Callable[[ProcessingStage], None]] = None
+    ) -> AgentResponse:
         """
         Process a user query end-to-end.
         
         Args:
             user_query: Natural language query from user
-            user_id: User identifier for rate limiting
+            user_id: User identifier for rate limiting and SQL batching
+            skip_rate_limit: Set when the caller already checked this query
+                against the rate limiter, so it isn't counted twice
+            on_progress: Called with each ProcessingStage as it starts
+            
+        Returns:
+            AgentResponse with results and insights
+        """
+        on_progress = on_progress or _ignore_progress
+        cache_key, early_response, query_analysis, context = self._prepare_query(
+            user_query, user_id, skip_rate_limit, on_progress
+        )
+        if early_response:
+            return early_response
+        
+        # Step 6: Generate and execute SQL if needed
+        sql_query = None
+        results = None
+        if query_analysis.query_type in [QueryType.SQL_ONLY, QueryType.BOTH]:
+            on_progress(ProcessingStage.GENERATING_SQL)
+            sql_query = self._generate_safe_sql(user_query, query_analysis, context, user_id)
+            on_progress(ProcessingStage.EXECUTING)
+            failure, results = self._execute_sql(sql_query, query_analysis, context)
+            if failure:
+                return failure
+        
+        # Step 7: Generate insights from results and context
+        on_progress(ProcessingStage.SUMMARIZING)
+        insights = self._generate_insights(user_query, results, context, query_analysis, sql_query=sql_query)
+        
+        return self._finish_query(cache_key, query_analysis, sql_query, results, context, insights)
+    
+    async def aprocess_query(
+        self,
+        user_query: str,
+        user_id: str = "default",
+        skip_rate_limit: bool = False,
+        on_progress: Optional[Callable[[ProcessingStage], None]] = None
+    ) -> AgentResponse:
+        """
+        Async variant of process_query.
+        
+        The Mistral calls go through the LLM service's async client, and
+        context retrieval and the blocking Databricks execution run in
+        worker threads, so several queries can be awaited together with
+        asyncio.gather. on_progress may be called from a worker thread.
+        
+        Args:
+            user_query: Natural language query from user
+            user_id: User identifier for rate limiting and SQL batching
+            skip_rate_limit: Set when the caller already checked this query
+                against the rate limiter, so it isn't counted twice
+            on_progress: Called with each ProcessingStage as it starts
             
         Returns:
             AgentResponse with results and insights
         """
+        on_progress = on_progress or _ignore_progress
+        # Context retrieval embeds the query, which is CPU work
+        cache_key, early_response, query_analysis, context = await asyncio.to_thread(
+            self._prepare_query, user_query, user_id, skip_rate_limit, on_progress
+        )
+        if early_response:
+            return early_response
+        
+        # Step 6: Generate and execute SQL if needed
+        sql_query = None
+        results = None
+        if query_analysis.query_type in [QueryType.SQL_ONLY, QueryType.BOTH]:
+            on_progress(ProcessingStage.GENERATING_SQL)
+            sql_query = await self._agenerate_safe_sql(user_query, query_analysis, context, user_id)
+            on_progress(ProcessingStage.EXECUTING)
+            failure, results = await asyncio.to_thread(
+                self._execute_sql, sql_query, query_analysis, context
+            )
+            if failure:
+                return failure
+        
+        # Step 7: Generate insights from results and context
+        on_progress(ProcessingStage.SUMMARIZING)
+        insights = await self._agenerate_insights(user_query, results, context, query_analysis, sql_query=sql_query)
+        
+        return self._finish_query(cache_key, query_analysis, sql_query, results, context, insights)
+    
+    def _cached_response(
+        self,
+        user_query: str,
+        user_id: str
+    ) -> Tuple[Tuple[int, str, str], Optional[AgentResponse]]:
+        """
+        Look up a still-valid response to the same question.
+        
+        Questions differing only in case or surrounding whitespace share an
+        entry, and the schema version in the key drops entries once tables
+        change. Hits skip the rest of the pipeline, including the agent's
+        rate limit, since they cost no LLM or Databricks calls. Each hit
+        returns its own copy, so callers may mutate the results.
+        
+        Args:
+            user_query: Natural language query from user
+            user_id: User identifier
+            
+        Returns:
+            Tuple of (cache key, cached response or None)
+        """
+        key = (self.schema_manager.schema_version, user_query.strip().lower(), user_id)
+        with self._response_cache_lock:
+            entry = self._response_cache.get(key)
+            if entry is not None:
+                expires_at, response = entry
+                if expires_at > time.monotonic():
+                    self._response_cache.move_to_end(key)
+                    logger.info("Returning cached response")
+                    return key, _copy_response(response)
+                del self._response_cache[key]
+        return key, None
+    
+    def _store_response(self, key: Tuple[int, str, str], response: AgentResponse):
+        """Cache a successful response under its question's key."""
+        if self.response_cache_size <= 0:
+            return
+        with self._response_cache_lock:
+            self._response_cache[key] = (time.monotonic() + self.response_cache_ttl, _copy_response(response))
+            self._response_cache.move_to_end(key)
+            while len(self._response_cache) > self.response_cache_size:
+                self._response_cache.popitem(last=False)
+    
+    def _prepare_query(
+        self,
+        user_query: str,
+        user_id: str,
+        skip_rate_limit: bool,
+        on_progress: Callable[[ProcessingStage], None]
+    ) -> Tuple[Optional[Tuple[int, str, str]], Optional[AgentResponse], Optional[QueryAnalysis], Optional[str]]:
+        """
+        Run the steps before SQL generation, shared by both pipelines.
+        
+        Args:
+            user_query: Natural language query from user
+            user_id: User identifier for rate limiting
+            skip_rate_limit: Whether the caller already applied the rate limit
+            on_progress: Progress callback
+            
+        Returns:
+            Tuple of (response cache key, early response or None, query
+            analysis, retrieved context); when an early response is
+            returned the last two are None, as is the key for a query
+            that failed validation
+        """
         logger.info(f"Processing query: {user_query}")
         
-        # Step 1: Security validation
+        # Step 1: Security validation, before any cached answer is served
         is_valid, error_msg = self.security_validator.validate_query(user_query)
         if not is_valid:
             logger.warning(f"Security validation failed: {error_msg}")
-            return AgentResponse(
+            return None, AgentResponse(
                 success=False,
                 query_type=QueryType.CLARIFICATION,
                 sql_query=None,
@@ -107,10 +437,36 @@ class DatabricksInsightAgent:
                 insights="",
                 clarification_needed=None,
                 error=f"Security validation failed: {error_msg}"
-            )
+            ), None, None
+        
+        cache_key, cached = self._cached_response(user_query, user_id)
+        if cached:
+            return cache_key, cached, None, None
         
+        on_progress(ProcessingStage.ANALYZING)
+        rejection, query_analysis, context = self._analyze_and_retrieve(user_query, user_id, skip_rate_limit)
+        return cache_key, rejection, query_analysis, context
+    
+    def _analyze_and_retrieve(
+        self,
+        user_query: str,
+        user_id: str,
+        skip_rate_limit: bool
+    ) -> Tuple[Optional[AgentResponse], Optional[QueryAnalysis], Optional[str]]:
+        """
+        Rate-limit and analyze a validated query, then retrieve its context.
+        
+        Args:
+            user_query: Natural language query from user
+            user_id: User identifier for rate limiting
+            skip_rate_limit: Whether the caller already applied the rate limit
+            
+        Returns:
+            Tuple of (early response or None, query analysis, retrieved context);
+            when an early response is returned the other two are None
+        """
         # Step 2: Rate limiting
-        if self.rate_limiter:
+        if self.rate_limiter and not skip_rate_limit:
             rate_ok, rate_msg = self.rate_limiter.check_rate_limit(user_id)
             if not rate_ok:
                 logger.warning(f"Rate limit exceeded for user {user_id}")
@@ -123,7 +479,7 @@ class DatabricksInsightAgent:
                     insights="",
                     clarification_needed=None,
                     error=rate_msg
-                )
+                ), None, None
         
         # Step 3: Analyze query to understand intent
         query_analysis = self.analyze_query(user_query)
@@ -140,57 +496,28 @@ class DatabricksInsightAgent:
                 insights="",
                 clarification_needed=clarification,
                 error=None
-            )
+            ), None, None
         
         # Step 5: Retrieve context if needed
         context = None
         if query_analysis.query_type in [QueryType.CONTEXT_ONLY, QueryType.BOTH]:
             context = self.context_retriever.get_context(user_query, top_k=3)
         
-        # Step 6: Generate and execute SQL if needed
-        sql_query = None
-        results = None
-        if query_analysis.query_type in [QueryType.SQL_ONLY, QueryType.BOTH]:
-            sql_query = self._generate_safe_sql(user_query, query_analysis, context)
-            
-            if sql_query:
-                # Validate SQL before execution
-                sql_valid, sql_error = self.security_validator.validate_sql(sql_query)
-                if not sql_valid:
-                    logger.error(f"Generated SQL failed validation: {sql_error}")
-                    return AgentResponse(
-                        success=False,
-                        query_type=query_analysis.query_type,
-                        sql_query=sql_query,
-                        results=None,
-                        context=context,
-                        insights="",
-                        clarification_needed=None,
-                        error=f"SQL validation failed: {sql_error}"
-                    )
-                
-                # Execute SQL
-                try:
-                    results = self.databricks_client.execute_query(sql_query)
-                except Exception as e:
-                    logger.error(f"SQL execution failed: {e}")
-                    return AgentResponse(
-                        success=False,
-                        query_type=query_analysis.query_type,
-                        sql_query=sql_query,
-                        results=None,
-                        context=context,
-                        insights="",
-                        clarification_needed=None,
-                        error=f"Query execution failed: {str(e)}"
-                    )
-        
-        # Step 7: Generate insights from results and context
-        insights = self._generate_insights(user_query, results, context, query_analysis, sql_query=sql_query)
-        
-        return AgentResponse(
+        return None, query_analysis, context
+    
+    def _finish_query(
+        self,
+        cache_key: Tuple[int, str, str],
+        analysis: QueryAnalysis,
+        sql_query: Optional[str],
+        results: Optional[List[Dict[str, Any]]],
+        context: Optional[str],
+        insights: str
+    ) -> AgentResponse:
+        """Build the successful response and cache it for repeated questions."""
+        response = AgentResponse(
             success=True,
-            query_type=query_analysis.query_type,
+            query_type=analysis.query_type,
             sql_query=sql_query,
             results=results,
             context=context,
@@ -198,6 +525,59 @@ class DatabricksInsightAgent:
             clarification_needed=None,
             error=None
         )
+        self._store_response(cache_key, response)
+        return response
+    
+    def _execute_sql(
+        self,
+        sql_query: Optional[str],
+        analysis: QueryAnalysis,
+        context: Optional[str]
+    ) -> Tuple[Optional[AgentResponse], Optional[List[Dict[str, Any]]]]:
+        """
+        Validate and execute generated SQL.
+        
+        Args:
+            sql_query: Generated SQL, or None when generation failed
+            analysis: Query analysis
+            context: Retrieved context
+            
+        Returns:
+            Tuple of (failure response or None, query results)
+        """
+        if not sql_query:
+            return None, None
+        
+        # Validate SQL before execution
+        sql_valid, sql_error = self.security_validator.validate_sql(sql_query)
+        if not sql_valid:
+            logger.error(f"Generated SQL failed validation: {sql_error}")
+            return AgentResponse(
+                success=False,
+                query_type=analysis.query_type,
+                sql_query=sql_query,
+                results=None,
+                context=context,
+                insights="",
+                clarification_needed=None,
+                error=f"SQL validation failed: {sql_error}"
+            ), None
+        
+        # Execute SQL
+        try:
+            return None, self.databricks_client.execute_query(sql_query)
+        except Exception as e:
+            logger.error(f"SQL execution failed: {e}")
+            return AgentResponse(
+                success=False,
+                query_type=analysis.query_type,
+                sql_query=sql_query,
+                results=None,
+                context=context,
+                insights="",
+                clarification_needed=None,
+                error=f"Query execution failed: {str(e)}"
+            ), None
     
     def analyze_query(self, user_query: str) -> QueryAnalysis:
         """
@@ -267,25 +647,26 @@ class DatabricksInsightAgent:
         self, 
         user_query: str, 
         analysis: QueryAnalysis,
-        context: Optional[str]
+        context: Optional[str],
+        user_id: str = "default"
     ) -> Optional[str]:
         """Generate safe SQL query from analysis."""
         if not analysis.target_tables:
             logger.warning("No target tables identified")
             return None
         
-        # Use the first identified table
-        table_name = analysis.target_tables[0]
-        
         # Try LLM-powered SQL generation if available
         if self.llm_service:
             try:
                 schema_info = self.schema_manager.get_schema_summary()
-                sql = self.llm_service.generate_sql_from_query(
-                    user_query=user_query,
-                    schema_info=schema_info,
-                    context=context
-                )
+                if self.query_batcher:
+                    sql = self.query_batcher.submit(user_query, schema_info, context, user_id).result()
+                else:
+                    sql = self.llm_service.generate_sql_from_query(
+                        user_query=user_query,
+                        schema_info=schema_info,
+                        context=context
+                    )
                 
                 if sql:
                     logger.info("Generated SQL using Mistral AI")
@@ -293,10 +674,53 @@ class DatabricksInsightAgent:
             except Exception as e:
                 logger.warning(f"LLM SQL generation failed, falling back to rule-based: {e}")
         
-        # Fallback to rule-based SQL generation
+        return self._generate_rule_based_sql(user_query, analysis, context)
+    
+    async def _agenerate_safe_sql(
+        self, 
+        user_query: str, 
+        analysis: QueryAnalysis,
+        context: Optional[str],
+        user_id: str = "default"
+    ) -> Optional[str]:
+        """Async variant of _generate_safe_sql."""
+        if not analysis.target_tables:
+            logger.warning("No target tables identified")
+            return None
+        
+        if self.llm_service:
+            try:
+                schema_info = self.schema_manager.get_schema_summary()
+                if self.query_batcher:
+                    # submit may send a full batch itself, so keep it off the loop
+                    sql = await asyncio.to_thread(
+                        lambda: self.query_batcher.submit(user_query, schema_info, context, user_id).result()
+                    )
+                else:
+                    sql = await self.llm_service.generate_sql_from_query_async(
+                        user_query=user_query,
+                        schema_info=schema_info,
+                        context=context
+                    )
+                
+                if sql:
+                    logger.info("Generated SQL using Mistral AI")
+                    return sql
+            except Exception as e:
+                logger.warning(f"LLM SQL generation failed, falling back to rule-based: {e}")
+        
+        return self._generate_rule_based_sql(user_query, analysis, context)
+    
+    def _generate_rule_based_sql(
+        self,
+        user_query: str,
+        analysis: QueryAnalysis,
+        context: Optional[str]
+    ) -> Optional[str]:
+        """Generate SQL from the parsed intent for the first target table."""
         # Parse query intent
         intent = self.sql_generator.parse_query_intent(user_query, context)
-        intent['table_name'] = table_name
+        intent['table_name'] = analysis.target_tables[0]
         
         # Add identified filters
         if analysis.identified_filters:
@@ -341,7 +765,38 @@ class DatabricksInsightAgent:
             except Exception as e:
                 logger.warning(f"LLM insights generation failed, falling back to rule-based: {e}")
         
-        # Fallback to rule-based insights generation
+        return self._generate_rule_based_insights(results, context)
+    
+    async def _agenerate_insights(
+        self,
+        user_query: str,
+        results: Optional[List[Dict[str, Any]]],
+        context: Optional[str],
+        analysis: QueryAnalysis,
+        sql_query: Optional[str] = None
+    ) -> str:
+        """Async variant of _generate_insights."""
+        if self.llm_service:
+            try:
+                insights = await self.llm_service.generate_insights_async(
+                    user_query=user_query,
+                    sql_query=sql_query,
+                    results=results,
+                    context=context
+                )
+                logger.info("Generated insights using Mistral AI")
+                return insights
+            except Exception as e:
+                logger.warning(f"LLM insights generation failed, falling back to rule-based: {e}")
+        
+        return self._generate_rule_based_insights(results, context)
+    
+    def _generate_rule_based_insights(
+        self,
+        results: Optional[List[Dict[str, Any]]],
+        context: Optional[str]
+    ) -> str:
+        """Summarize results and context without the LLM."""
         insights = []
         
         # Add context-based insights
@@ -3,7 +3,10 @@ Databricks client for executing queries and managing connections.
 """
 
 import logging
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import List, Dict, Any, Iterator, Optional
 from databricks import sql
 import os
 
@@ -11,13 +14,24 @@ logger = logging.getLogger(__name__)
 
 
 class DatabricksClient:
-    """Client for interacting with Databricks SQL warehouse."""
+    """
+    Client for interacting with Databricks SQL warehouse.
+    
+    SQL connector connections must not be used by two threads at once, so
+    each query borrows a connection from a small pool and returns it when
+    done. Up to max_workers + 1 idle connections (one per executor() worker
+    plus the caller) are kept for reuse; a connection opened beyond that
+    while the pool is busy is closed when returned. Connections therefore
+    don't outlive the threads that used them, however many short-lived
+    threads run queries. disconnect() closes all of them.
+    """
     
     def __init__(
         self,
         server_hostname: str,
         http_path: str,
-        access_token: str
+        access_token: str,
+        max_workers: int = 8
     ):
         """
         Initialize Databricks client.
@@ -26,29 +40,104 @@ class DatabricksClient:
             server_hostname: Databricks workspace hostname
             http_path: SQL warehouse HTTP path
             access_token: Personal access token for authentication
+            max_workers: Size of the shared worker pool; the connection
+                pool keeps one more idle connection than this
         """
         self.server_hostname = server_hostname
         self.http_path = http_path
         self.access_token = access_token
-        self.connection = None
+        self.max_workers = max_workers
+        self.pool_size = max_workers + 1
+        self._lock = threading.Lock()
+        # Idle connections, most recently returned last; bumping the
+        # generation on disconnect makes borrowed ones close on return
+        self._idle = []
+        self._generation = 0
+        self._executor: Optional[ThreadPoolExecutor] = None
     
-    def connect(self):
-        """Establish connection to Databricks."""
+    def executor(self) -> ThreadPoolExecutor:
+        """
+        Shared worker pool for running queries on this client concurrently.
+        
+        The pool lives until disconnect() and is sized to the connection
+        pool, so its workers never have to open connections beyond it.
+        
+        Returns:
+            ThreadPoolExecutor with max_workers threads
+        """
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="databricks-query"
+                )
+            return self._executor
+    
+    def _open_connection(self):
+        """Open a new warehouse connection."""
         try:
-            self.connection = sql.connect(
+            connection = sql.connect(
                 server_hostname=self.server_hostname,
                 http_path=self.http_path,
                 access_token=self.access_token
             )
             logger.info("Successfully connected to Databricks")
+            return connection
         except Exception as e:
             logger.error(f"Failed to connect to Databricks: {e}")
             raise
     
+    def _release(self, connection, generation: int):
+        """Return a borrowed connection to the pool, or close it if not needed."""
+        with self._lock:
+            keep = generation == self._generation and len(self._idle) < self.pool_size
+            if keep:
+                self._idle.append(connection)
+        
+        if not keep:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing Databricks connection: {e}")
+    
+    @contextmanager
+    def _borrow(self):
+        """Hold a pooled connection for the duration of the block."""
+        with self._lock:
+            generation = self._generation
+            connection = self._idle.pop() if self._idle else None
+        if connection is None:
+            connection = self._open_connection()
+        
+        try:
+            yield connection
+        finally:
+            self._release(connection, generation)
+    
+    def connect(self):
+        """Open a connection ahead of the first query and keep it in the pool."""
+        with self._lock:
+            generation = self._generation
+        self._release(self._open_connection(), generation)
+    
     def disconnect(self):
-        """Close the Databricks connection."""
-        if self.connection:
-            self.connection.close()
+        """Close all Databricks connections opened by this client."""
+        with self._lock:
+            connections, self._idle = self._idle, []
+            self._generation += 1
+            executor, self._executor = self._executor, None
+        
+        if executor is not None:
+            executor.shutdown(wait=False)
+        
+        # Borrowed connections are closed as their queries return them
+        for connection in connections:
+            try:
+                connection.close()
+            except Exception as e:
+                logger.debug(f"Error closing Databricks connection: {e}")
+        
+        if connections:
             logger.info("Disconnected from Databricks")
     
     def execute_query(self, sql_query: str) -> List[Dict[str, Any]]:
@@ -61,18 +150,19 @@ class DatabricksClient:
         Returns:
             List of dictionaries representing rows
         """
-        if not self.connection:
-            self.connect()
-        
         try:
-            cursor = self.connection.cursor()
-            cursor.execute(sql_query)
-            
-            # Fetch column names
-            columns = [desc[0] for desc in cursor.description]
-            
-            # Fetch all rows
-            rows = cursor.fetchall()
+            with self._borrow() as connection:
+                cursor = connection.cursor()
+                try:
+                    cursor.execute(sql_query)
+                    
+                    # Fetch column names
+                    columns = [desc[0] for desc in cursor.description]
+                    
+                    # Fetch all rows
+                    rows = cursor.fetchall()
+                finally:
+                    cursor.close()
             
             # Convert to list of dictionaries
             results = []
@@ -82,7 +172,6 @@ class DatabricksClient:
                     row_dict[col] = row[i]
                 results.append(row_dict)
             
-            cursor.close()
             logger.info(f"Query executed successfully, returned {len(results)} rows")
             return results
             
@@ -90,6 +179,46 @@ class DatabricksClient:
             logger.error(f"Error executing query: {e}")
             raise
     
+    def iter_query(self, sql_query: str, batch_size: int = 1000) -> Iterator[Dict[str, Any]]:
+        """
+        Execute a SQL query and yield rows as each batch is fetched.
+        
+        Unlike execute_query, the caller can start on the first rows while
+        the rest of the result is still being transferred. The connection
+        stays borrowed until the generator finishes or is closed.
+        
+        Args:
+            sql_query: SQL query to execute
+            batch_size: Rows requested per fetch
+            
+        Yields:
+            Dictionaries representing rows
+        """
+        with self._borrow() as connection:
+            cursor = connection.cursor()
+            try:
+                cursor.execute(sql_query)
+                
+                # Fetch column names
+                columns = [desc[0] for desc in cursor.description]
+                
+                count = 0
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(zip(columns, row))
+                    count += len(rows)
+                
+                logger.info(f"Query executed successfully, returned {count} rows")
+                
+            except Exception as e:
+                logger.error(f"Error executing query: {e}")
+                raise
+            finally:
+                cursor.close()
+    
     def get_table_schema(self, table_name: str, catalog: str = "hive_metastore", schema: str = "default") -> Dict[str, str]:
         """
         Get the schema (columns and types) for a table.
@@ -6,7 +6,8 @@ Handles storing and retrieving FAISS indices and documents in DBFS.
 import os
 import logging
 import pickle
-from typing import Optional, List
+from pathlib import PurePosixPath
+from typing import Any, Dict, Optional, List
 import tempfile
 
 logger = logging.getLogger(__name__)
@@ -34,9 +35,17 @@ class DBFSStorage:
         self.local_cache_dir = local_cache_dir
         self.is_databricks = self._check_databricks_environment()
         
+        # Resolve the storage root once; every path below is joined onto it
+        self._base_path = PurePosixPath(
+            dbfs_mount_point if self.is_databricks else local_cache_dir
+        )
+        # Directories already created this session (skips repeat makedirs calls)
+        self._known_dirs: set[str] = set()
+        
         # Create cache directory if needed
         if not self.is_databricks:
             os.makedirs(local_cache_dir, exist_ok=True)
+            self._known_dirs.add(str(self._base_path))
             logger.info(f"Using local cache: {local_cache_dir}")
         else:
             logger.info(f"Using DBFS storage: {dbfs_mount_point}")
@@ -45,6 +54,17 @@ class DBFSStorage:
         """Check if running in Databricks environment."""
         return os.path.exists('/databricks/spark')
     
+    def _full_path(self, name: str) -> str:
+        """Join a relative name onto the active storage root."""
+        return str(self._base_path / name)
+    
+    def _ensure_dir(self, path: str):
+        """Create the parent directory of path unless it is already known to exist."""
+        directory = os.path.dirname(path)
+        if directory and directory not in self._known_dirs:
+            os.makedirs(directory, exist_ok=True)
+            self._known_dirs.add(directory)
+    
     def save_faiss_index(
         self,
         index,
@@ -63,17 +83,13 @@ class DBFSStorage:
         try:
             import faiss
             
+            index_path = self._full_path(index_name)
+            self._ensure_dir(index_path)
+            faiss.write_index(index, index_path)
+            
             if self.is_databricks:
-                # Save to DBFS
-                index_path = os.path.join(self.dbfs_mount_point, index_name)
-                os.makedirs(os.path.dirname(index_path), exist_ok=True)
-                faiss.write_index(index, index_path)
                 logger.info(f"✅ FAISS index saved to DBFS: {index_path}")
             else:
-                # Save to local cache
-                index_path = os.path.join(self.local_cache_dir, index_name)
-                os.makedirs(os.path.dirname(index_path), exist_ok=True)
-                faiss.write_index(index, index_path)
                 logger.info(f"✅ FAISS index saved locally: {index_path}")
             
             return True
@@ -95,10 +111,7 @@ class DBFSStorage:
         try:
             import faiss
             
-            if self.is_databricks:
-                index_path = os.path.join(self.dbfs_mount_point, index_name)
-            else:
-                index_path = os.path.join(self.local_cache_dir, index_name)
+            index_path = self._full_path(index_name)
             
             if not os.path.exists(index_path):
                 logger.warning(f"FAISS index not found: {index_path}")
@@ -128,12 +141,9 @@ class DBFSStorage:
             True if successful, False otherwise
         """
         try:
-            if self.is_databricks:
-                file_path = os.path.join(self.dbfs_mount_point, filename)
-            else:
-                file_path = os.path.join(self.local_cache_dir, filename)
+            file_path = self._full_path(filename)
             
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
+            self._ensure_dir(file_path)
             
             with open(file_path, 'wb') as f:
                 pickle.dump(documents, f)
@@ -156,10 +166,7 @@ class DBFSStorage:
             List of documents or None if not found
         """
         try:
-            if self.is_databricks:
-                file_path = os.path.join(self.dbfs_mount_point, filename)
-            else:
-                file_path = os.path.join(self.local_cache_dir, filename)
+            file_path = self._full_path(filename)
             
             if not os.path.exists(file_path):
                 logger.warning(f"Documents file not found: {file_path}")
@@ -193,14 +200,14 @@ class DBFSStorage:
         try:
             if self.is_databricks:
                 # Use dbutils in Databricks
-                full_dbfs_path = os.path.join(self.dbfs_mount_point, dbfs_path)
+                full_dbfs_path = self._full_path(dbfs_path)
                 
                 # In Databricks notebook, you would use:
                 # dbutils.fs.cp(f"file:{local_path}", full_dbfs_path)
                 
                 # For now, use regular file copy
                 import shutil
-                os.makedirs(os.path.dirname(full_dbfs_path), exist_ok=True)
+                self._ensure_dir(full_dbfs_path)
                 shutil.copy2(local_path, full_dbfs_path)
                 
                 logger.info(f"✅ File uploaded to DBFS: {full_dbfs_path}")
@@ -208,8 +215,8 @@ class DBFSStorage:
             else:
                 # In local mode, just copy to cache
                 import shutil
-                dest_path = os.path.join(self.local_cache_dir, dbfs_path)
-                os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+                dest_path = self._full_path(dbfs_path)
+                self._ensure_dir(dest_path)
                 shutil.copy2(local_path, dest_path)
                 
                 logger.info(f"✅ File copied to cache: {dest_path}")
@@ -236,13 +243,13 @@ class DBFSStorage:
         """
         try:
             if self.is_databricks:
-                full_dbfs_path = os.path.join(self.dbfs_mount_point, dbfs_path)
+                full_dbfs_path = self._full_path(dbfs_path)
                 
                 # In Databricks notebook, you would use:
                 # dbutils.fs.cp(full_dbfs_path, f"file:{local_path}")
                 
                 import shutil
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                self._ensure_dir(local_path)
                 shutil.copy2(full_dbfs_path, local_path)
                 
                 logger.info(f"✅ File downloaded from DBFS: {full_dbfs_path}")
@@ -250,8 +257,8 @@ class DBFSStorage:
             else:
                 # In local mode, copy from cache
                 import shutil
-                source_path = os.path.join(self.local_cache_dir, dbfs_path)
-                os.makedirs(os.path.dirname(local_path), exist_ok=True)
+                source_path = self._full_path(dbfs_path)
+                self._ensure_dir(local_path)
                 shutil.copy2(source_path, local_path)
                 
                 logger.info(f"✅ File copied from cache: {source_path}")
@@ -272,10 +279,7 @@ class DBFSStorage:
             List of file paths
         """
         try:
-            if self.is_databricks:
-                full_path = os.path.join(self.dbfs_mount_point, path)
-            else:
-                full_path = os.path.join(self.local_cache_dir, path)
+            full_path = self._full_path(path)
             
             if not os.path.exists(full_path):
                 return []
@@ -304,10 +308,7 @@ class DBFSStorage:
             True if successful, False otherwise
         """
         try:
-            if self.is_databricks:
-                full_path = os.path.join(self.dbfs_mount_point, path)
-            else:
-                full_path = os.path.join(self.local_cache_dir, path)
+            full_path = self._full_path(path)
             
             if os.path.exists(full_path):
                 os.remove(full_path)
@@ -344,35 +345,110 @@ class FAISSManager:
         self.embedding_model_name = embedding_model_name
         self.index = None
         self.documents = []
+        # FAISS id of each entry in self.documents, and the reverse lookup
+        self._ids: List[int] = []
+        self._id_to_doc: Dict[int, Any] = {}
     
     def initialize_index(self, dimension: int = 384):
         """
         Initialize a new FAISS index.
         
+        The flat index is wrapped in an IndexIDMap2 so documents can later be
+        removed or replaced without rebuilding the whole index.
+        
         Args:
             dimension: Embedding dimension (default for all-MiniLM-L6-v2)
         """
         import faiss
-        self.index = faiss.IndexFlatL2(dimension)
+        self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(dimension))
         logger.info(f"Initialized new FAISS index with dimension {dimension}")
     
-    def add_embeddings(self, embeddings, documents):
+    def _set_documents(self, documents, ids):
+        """Replace the document list and its parallel id column."""
+        self.documents = list(documents)
+        self._ids = list(ids)
+        self._id_to_doc = dict(zip(self._ids, self.documents))
+    
+    def _ensure_id_map(self):
+        """Convert an index saved before id support into an IndexIDMap2."""
+        import faiss
+        import numpy as np
+        
+        if not hasattr(self.index, 'id_map'):
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            id_index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.index.d))
+            id_index.add_with_ids(vectors, np.asarray(self._ids, dtype='int64'))
+            self.index = id_index
+    
+    def add_embeddings(self, embeddings, documents, ids: Optional[List[int]] = None) -> List[int]:
         """
         Add embeddings and documents to index.
         
         Args:
             embeddings: Numpy array of embeddings
             documents: List of corresponding documents
+            ids: Optional ids for the documents (defaults to the next free ids)
+            
+        Returns:
+            Ids assigned to the documents
         """
         import numpy as np
         
         if self.index is None:
             self.initialize_index(dimension=embeddings.shape[1])
+        self._ensure_id_map()
+        
+        if ids is None:
+            next_id = max(self._ids) + 1 if self._ids else 0
+            ids = list(range(next_id, next_id + len(documents)))
         
-        self.index.add(embeddings.astype('float32'))
+        self.index.add_with_ids(embeddings.astype('float32'), np.asarray(ids, dtype='int64'))
         self.documents.extend(documents)
+        self._ids.extend(ids)
+        self._id_to_doc.update(zip(ids, documents))
         
         logger.info(f"Added {len(documents)} documents to index. Total: {len(self.documents)}")
+        return ids
+    
+    def remove_documents(self, ids: List[int]) -> int:
+        """
+        Remove documents from the index by id.
+        
+        Args:
+            ids: Ids returned by add_embeddings
+            
+        Returns:
+            Number of documents removed
+        """
+        import numpy as np
+        
+        drop = set(ids) & self._id_to_doc.keys()
+        if self.index is None or not drop:
+            return 0
+        
+        self._ensure_id_map()
+        self.index.remove_ids(np.fromiter(drop, dtype='int64', count=len(drop)))
+        
+        # remove_ids keeps the survivors in order; mirror that in the document list
+        kept = [(doc_id, doc) for doc_id, doc in zip(self._ids, self.documents) if doc_id not in drop]
+        self._set_documents((doc for _, doc in kept), (doc_id for doc_id, _ in kept))
+        
+        logger.info(f"Removed {len(drop)} documents from index. Total: {len(self.documents)}")
+        return len(drop)
+    
+    def update_document(self, doc_id: int, embedding, document):
+        """
+        Replace the document stored under doc_id.
+        
+        Args:
+            doc_id: Id of the document to replace
+            embedding: New embedding vector for the document
+            document: New document
+        """
+        import numpy as np
+        
+        self.remove_documents([doc_id])
+        self.add_embeddings(np.asarray([embedding]), [document], ids=[doc_id])
     
     def save_to_dbfs(self, index_name: str = "faiss_index.index") -> bool:
         """Save index and documents to DBFS."""
@@ -396,33 +472,57 @@ class FAISSManager:
         if documents is None:
             return False
         
-        self.documents = documents
+        if hasattr(self.index, 'id_map'):
+            import faiss
+            ids = faiss.vector_to_array(self.index.id_map).tolist()
+        else:
+            ids = range(len(documents))
+        self._set_documents(documents, ids)
         logger.info(f"✅ Loaded FAISS index with {len(self.documents)} documents")
         return True
     
-    def search(self, query_embedding, top_k: int = 5):
+    def search_raw(self, query_embedding, top_k: int = 5):
         """
-        Search for similar documents.
+        Search the index and return the raw FAISS arrays.
         
         Args:
             query_embedding: Query embedding vector
             top_k: Number of results to return
             
         Returns:
-            List of (document, score) tuples
+            (indices, distances) arrays of shape (1, top_k); both are empty
+            when the index has no documents
         """
         import numpy as np
         
         if self.index is None or len(self.documents) == 0:
             logger.warning("Index is empty")
-            return []
+            return np.empty((1, 0), dtype='int64'), np.empty((1, 0), dtype='float32')
         
         query_embedding = np.array([query_embedding]).astype('float32')
         distances, indices = self.index.search(query_embedding, top_k)
+        return indices, distances
+    
+    def search(self, query_embedding, top_k: int = 5):
+        """
+        Search for similar documents.
+        
+        Args:
+            query_embedding: Query embedding vector
+            top_k: Number of results to return
+            
+        Returns:
+            List of (document, score) tuples
+        """
+        indices, distances = self.search_raw(query_embedding, top_k)
         
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.documents):
-                results.append((self.documents[idx], float(distances[0][i])))
+        # Drop FAISS's -1 padding in one vectorized pass, then map ids to documents
+        idx0, dist0 = indices[0], distances[0]
+        mask = idx0 >= 0
         
-        return results
+        id_to_doc = self._id_to_doc
+        return [
+            (id_to_doc[doc_id], d)
+            for doc_id, d in zip(idx0[mask].tolist(), dist0[mask].tolist())
+            if doc_id in id_to_doc
+        ]
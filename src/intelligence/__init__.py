@@ -3,7 +3,7 @@ from .sql_generator import SQLGenerator, SchemaManager, TableSchema
 from .schema_loader import SchemaLoader, create_schema_manager_from_databricks
 from .sql_error_correction import SQLCorrector, RetryableQueryExecutor
 from .context_retriever import ContextRetriever, Document
-from .document_processor import DocumentChunker, DocumentLoader, create_knowledge_base_documents
+from .document_processor import DocumentChunker, CDCChunker, TokenChunker, DocumentLoader, create_knowledge_base_documents
 from .llm_service import MistralLLMService, create_llm_service
 
 __all__ = [
@@ -17,6 +17,8 @@ __all__ = [
     'ContextRetriever',
     'Document',
     'DocumentChunker',
+    'CDCChunker',
+    'TokenChunker',
     'DocumentLoader',
     'create_knowledge_base_documents',
     'MistralLLMService',
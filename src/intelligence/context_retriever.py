@@ -6,6 +6,9 @@ Retrieves relevant documentation and context for query understanding.
 import logging
 import os
 import pickle
+from bisect import bisect_left
+from contextlib import contextmanager
+from itertools import accumulate
 from typing import List, Dict, Any, Optional
 import numpy as np
 
@@ -16,12 +19,68 @@ except ImportError:
     faiss = None
     SentenceTransformer = None
 
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
 logger = logging.getLogger(__name__)
 
+SUPPORTED_BACKENDS = ("sentence-transformers", "onnx")
+
+
+@contextmanager
+def _index_lock(index_path: str, exclusive: bool = True):
+    """
+    Hold a cross-process lock on ``<index_path>.lock``.
+    
+    Writers take it exclusively so concurrent saves serialize; readers take
+    it shared so they never see a new index paired with old documents.
+    Windows has no shared mode, so readers lock exclusively there.
+    """
+    try:
+        lock_file = open(index_path + ".lock", 'a+b')
+    except OSError:
+        if exclusive:
+            raise
+        # Read-only location, so no writer can be holding the lock either
+        yield
+        return
+    
+    with lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        else:
+            lock_file.seek(0)
+            msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def _fsync_replace(tmp_path: str, final_path: str):
+    """Flush tmp_path to disk and atomically move it over final_path."""
+    with open(tmp_path, 'r+b') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, final_path)
+
 
 class Document:
     """Represents a document in the knowledge base."""
     
+    __slots__ = ('content', 'metadata', 'length')
+    
     def __init__(self, content: str, metadata: Optional[Dict[str, Any]] = None):
         """
         Initialize a document.
@@ -30,8 +89,23 @@ class Document:
             content: Document text content
             metadata: Optional metadata (e.g., source, table_name, category)
         """
+        if metadata is not None and not isinstance(metadata, dict):
+            # Flatten mapping views (e.g. DocumentChunk.metadata) so the
+            # document stays picklable and msgpack-serializable
+            metadata = dict(metadata)
+        
         self.content = content
         self.metadata = metadata or {}
+        self.length = len(content)
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        return {'content': self.content, 'metadata': self.metadata, 'length': self.length}
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        """Restore a pickled document, filling in fields added since it was saved."""
+        self.content = state['content']
+        self.metadata = state.get('metadata') or {}
+        self.length = state.get('length', len(self.content))
     
     def __repr__(self):
         return f"Document(content='{self.content[:50]}...', metadata={self.metadata})"
@@ -43,7 +117,8 @@ class ContextRetriever:
     def __init__(
         self,
         embedding_model: str = "all-MiniLM-L6-v2",
-        index_path: Optional[str] = None
+        index_path: Optional[str] = None,
+        backend: str = "sentence-transformers"
     ):
         """
         Initialize context retriever.
@@ -51,78 +126,334 @@ class ContextRetriever:
         Args:
             embedding_model: Name of the sentence transformer model
             index_path: Path to save/load FAISS index
+            backend: Embedding runtime, "sentence-transformers" (PyTorch) or
+                "onnx" (ONNX Runtime via optimum, faster on CPU)
         """
-        if faiss is None or SentenceTransformer is None:
+        if backend not in SUPPORTED_BACKENDS:
+            raise ValueError(
+                f"Unsupported embedding backend: {backend}. "
+                f"Choose from: {', '.join(SUPPORTED_BACKENDS)}"
+            )
+        if faiss is None or (backend == "sentence-transformers" and SentenceTransformer is None):
             raise ImportError(
                 "FAISS and sentence-transformers are required. "
                 "Install with: pip install faiss-cpu sentence-transformers"
             )
         
         self.embedding_model_name = embedding_model
-        self.model = SentenceTransformer(embedding_model)
+        self.backend = backend
+        self.tokenizer = None
+        self.model = None
+        self.dimension = None
+        self._load_model()
         self.index_path = index_path
         self.index = None
-        self.documents: List[Document] = []
-        self.dimension = self.model.get_sentence_embedding_dimension()
+        # Documents are stored column-wise; see the documents property
+        self._contents: List[str] = []
+        self._metadata: List[Dict[str, Any]] = []
+        # FAISS id of each document, and the reverse id -> position lookup
+        self._ids: List[int] = []
+        self._positions: Dict[int, int] = {}
+        # True when the in-memory index has diverged from the file at index_path
+        self._index_dirty = False
+        self._index_bytes = None
         
         # Load existing index if available
         if index_path and os.path.exists(index_path):
             self.load_index()
     
-    def add_documents(self, documents: List[Document]):
+    def __getstate__(self) -> Dict[str, Any]:
+        """
+        Pickle only what is needed to rebuild the retriever in another process.
+        
+        The SentenceTransformer model and FAISS index are not sent across;
+        the child reopens them on first use. The index is only serialized
+        inline when it has no up-to-date copy on disk.
+        """
+        state = {
+            'model_name': self.embedding_model_name,
+            'backend': self.backend,
+            'index_path': self.index_path,
+            'contents': self._contents,
+            'metadata': self._metadata,
+            'ids': self._ids,
+            'index_bytes': None,
+        }
+        on_disk = self.index_path and os.path.exists(self.index_path)
+        if self.index is not None and (self._index_dirty or not on_disk):
+            state['index_bytes'] = faiss.serialize_index(self.index)
+        return state
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        """Restore a pickled retriever; heavy resources load lazily."""
+        self.embedding_model_name = state['model_name']
+        self.backend = state.get('backend', 'sentence-transformers')
+        self.tokenizer = None
+        self.model = None
+        self.index = None
+        self.index_path = state['index_path']
+        self._contents = state['contents']
+        self._metadata = state['metadata']
+        self._set_ids(state['ids'])
+        self.dimension = None
+        self._index_bytes = state.get('index_bytes')
+        self._index_dirty = self._index_bytes is not None
+    
+    def _ensure_loaded(self):
+        """Lazily initialize the embedding model and index after unpickling."""
+        if self.model is None:
+            self._load_model()
+        
+        if self.index is None:
+            if self._index_bytes is not None:
+                self.index = faiss.deserialize_index(self._index_bytes)
+                self._index_bytes = None
+            elif self.index_path and os.path.exists(self.index_path) and self._contents:
+                # Memory-map rather than read so workers share the page cache
+                self.index = faiss.read_index(
+                    self.index_path, getattr(faiss, 'IO_FLAG_MMAP', 0)
+                )
+    
+    def _load_model(self):
+        """Load the embedding model for the configured backend."""
+        if self.backend == "onnx":
+            try:
+                from optimum.onnxruntime import ORTModelForFeatureExtraction
+                from transformers import AutoTokenizer
+            except ImportError:
+                raise ImportError(
+                    "optimum and onnxruntime are required for the onnx backend. "
+                    "Install with: pip install optimum[onnxruntime]"
+                )
+            
+            # Short sentence-transformers names live under that org on the Hub
+            model_id = self.embedding_model_name
+            if '/' not in model_id and not os.path.isdir(model_id):
+                model_id = f"sentence-transformers/{model_id}"
+            
+            self.tokenizer = AutoTokenizer.from_pretrained(model_id)
+            self.model = ORTModelForFeatureExtraction.from_pretrained(
+                model_id,
+                export=True,
+                provider="CPUExecutionProvider"
+            )
+            self.dimension = self.model.config.hidden_size
+        else:
+            self.model = SentenceTransformer(self.embedding_model_name)
+            self.dimension = self.model.get_sentence_embedding_dimension()
+    
+    def _encode(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts with the configured backend.
+        
+        Returns L2-normalized float32 embeddings ready for index.add/search,
+        so no separate normalize or dtype-conversion pass is needed.
+        """
+        if self.backend == "onnx":
+            inputs = self.tokenizer(
+                texts, padding=True, truncation=True, return_tensors="np"
+            )
+            outputs = self.model(**inputs)
+            
+            # Mean-pool token embeddings over the attention mask, then L2-normalize
+            token_embeddings = np.asarray(outputs.last_hidden_state)
+            mask = inputs["attention_mask"][..., None].astype(token_embeddings.dtype)
+            summed = (token_embeddings * mask).sum(axis=1)
+            embeddings = np.asarray(summed / np.clip(mask.sum(axis=1), 1e-9, None), dtype='float32')
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+            return embeddings
+        
+        embeddings = self.model.encode(
+            texts,
+            batch_size=256,
+            convert_to_numpy=True,
+            normalize_embeddings=True,
+            show_progress_bar=False
+        )
+        # No-op for the float32 arrays sentence-transformers returns
+        return np.asarray(embeddings, dtype='float32')
+    
+    @property
+    def documents(self) -> List[Document]:
+        """
+        Documents in index order, assembled from the content/metadata columns.
+        
+        Builds a new list on every access; use document_count for the size.
+        """
+        return [Document(c, m) for c, m in zip(self._contents, self._metadata)]
+    
+    @documents.setter
+    def documents(self, documents: List[Document]):
+        self._contents = [doc.content for doc in documents]
+        self._metadata = [doc.metadata for doc in documents]
+        self._set_ids(range(len(self._contents)))
+    
+    @property
+    def document_count(self) -> int:
+        """Number of indexed documents, without assembling the documents list."""
+        return len(self._contents)
+    
+    def _set_ids(self, ids):
+        """Replace the document id column and rebuild the id -> position lookup."""
+        self._ids = list(ids)
+        self._positions = {doc_id: pos for pos, doc_id in enumerate(self._ids)}
+    
+    def _sync_ids_from_index(self):
+        """Read document ids back from a loaded index (positions for pre-IDMap indices)."""
+        if hasattr(self.index, 'id_map'):
+            self._set_ids(faiss.vector_to_array(self.index.id_map).tolist())
+        else:
+            self._set_ids(range(self.index.ntotal))
+    
+    def _ensure_id_map(self):
+        """
+        Make sure the index supports add_with_ids/remove_ids.
+        
+        Indices saved before id support are plain flat indices; their vectors
+        are copied once into an IndexIDMap2 keyed by the current ids.
+        """
+        if self.index is None:
+            self.index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.dimension))
+        elif not hasattr(self.index, 'id_map'):
+            vectors = self.index.reconstruct_n(0, self.index.ntotal)
+            id_index = faiss.IndexIDMap2(faiss.IndexFlatL2(self.index.d))
+            id_index.add_with_ids(vectors, np.asarray(self._ids, dtype='int64'))
+            self.index = id_index
+    
+    def add_documents(self, documents: List[Document]) -> List[int]:
         """
         Add documents to the knowledge base.
         
         Args:
             documents: List of Document objects to add
+            
+        Returns:
+            Ids assigned to the documents, usable with remove_documents/update_document
         """
         if not documents:
             logger.warning("No documents to add")
-            return
+            return []
+        
+        self._ensure_loaded()
         
+        next_id = max(self._ids) + 1 if self._ids else 0
+        ids = list(range(next_id, next_id + len(documents)))
+        self._add_with_ids(documents, ids)
+        
+        logger.info(f"Added {len(documents)} documents to index. Total: {len(self._contents)}")
+        return ids
+    
+    def _add_with_ids(self, documents: List[Document], ids: List[int]):
+        """Embed documents and append them to the index under the given ids."""
         # Generate embeddings for documents
         texts = [doc.content for doc in documents]
-        embeddings = self.model.encode(texts, convert_to_numpy=True)
+        embeddings = self._encode(texts)
         
         # Create or update FAISS index
-        if self.index is None:
-            self.index = faiss.IndexFlatL2(self.dimension)
+        self._ensure_id_map()
         
         # Add to index
-        self.index.add(embeddings.astype('float32'))
-        self.documents.extend(documents)
+        self.index.add_with_ids(embeddings, np.asarray(ids, dtype='int64'))
+        start = len(self._contents)
+        self._contents.extend(texts)
+        self._metadata.extend(doc.metadata for doc in documents)
+        self._ids.extend(ids)
+        self._positions.update((doc_id, start + i) for i, doc_id in enumerate(ids))
+        self._index_dirty = True
+    
+    def remove_documents(self, ids: List[int]) -> int:
+        """
+        Remove documents from the index without re-embedding the rest.
         
-        logger.info(f"Added {len(documents)} documents to index. Total: {len(self.documents)}")
+        Args:
+            ids: Document ids returned by add_documents
+            
+        Returns:
+            Number of documents removed
+        """
+        self._ensure_loaded()
+        
+        drop = set(ids) & self._positions.keys()
+        if self.index is None or not drop:
+            return 0
+        
+        self._ensure_id_map()
+        self.index.remove_ids(np.fromiter(drop, dtype='int64', count=len(drop)))
+        
+        # remove_ids keeps the survivors in order, so filter the columns the same way
+        keep = [pos for pos, doc_id in enumerate(self._ids) if doc_id not in drop]
+        self._contents = [self._contents[pos] for pos in keep]
+        self._metadata = [self._metadata[pos] for pos in keep]
+        self._set_ids(self._ids[pos] for pos in keep)
+        self._index_dirty = True
+        
+        logger.info(f"Removed {len(drop)} documents from index. Total: {len(self._contents)}")
+        return len(drop)
     
-    def search(self, query: str, top_k: int = 3) -> List[tuple[Document, float]]:
+    def update_document(self, doc_id: int, document: Document):
         """
-        Search for relevant documents.
+        Replace the document stored under doc_id, re-embedding only that document.
+        
+        Args:
+            doc_id: Id of the document to replace
+            document: New document content and metadata
+        """
+        self.remove_documents([doc_id])
+        self._add_with_ids([document], [doc_id])
+        logger.info(f"Updated document {doc_id}")
+    
+    def search_raw(self, query: str, top_k: int = 3) -> tuple[np.ndarray, np.ndarray]:
+        """
+        Search the index without building Document objects.
         
         Args:
             query: Search query
             top_k: Number of top results to return
             
         Returns:
-            List of (Document, score) tuples
+            (indices, distances) arrays of shape (1, top_k) as returned by FAISS;
+            both are empty when the index has no documents
         """
-        if self.index is None or len(self.documents) == 0:
+        self._ensure_loaded()
+        
+        if self.index is None or len(self._contents) == 0:
             logger.warning("No documents in index")
-            return []
+            return np.empty((1, 0), dtype='int64'), np.empty((1, 0), dtype='float32')
         
         # Generate query embedding
-        query_embedding = self.model.encode([query], convert_to_numpy=True)
+        query_embedding = self._encode([query])
         
         # Search in FAISS index
-        top_k = min(top_k, len(self.documents))
-        distances, indices = self.index.search(query_embedding.astype('float32'), top_k)
+        top_k = min(top_k, len(self._contents))
+        distances, indices = self.index.search(query_embedding, top_k)
+        return indices, distances
+    
+    def search(self, query: str, top_k: int = 3) -> List[tuple[Document, float]]:
+        """
+        Search for relevant documents.
         
-        # Retrieve documents with scores
-        results = []
-        for i, idx in enumerate(indices[0]):
-            if idx < len(self.documents):
-                doc = self.documents[idx]
-                score = float(distances[0][i])
-                results.append((doc, score))
+        Args:
+            query: Search query
+            top_k: Number of top results to return
+            
+        Returns:
+            List of (Document, score) tuples
+        """
+        indices, distances = self.search_raw(query, top_k)
+        if indices.size == 0:
+            return []
+        
+        # Drop FAISS's -1 padding in one vectorized pass
+        idx0, dist0 = indices[0], distances[0]
+        mask = idx0 >= 0
+        
+        # Map ids back to column positions; documents are only materialized for the hits
+        contents, metadata, positions = self._contents, self._metadata, self._positions
+        results = [
+            (Document(contents[pos], metadata[pos]), float(d))
+            for doc_id, d in zip(idx0[mask].tolist(), dist0[mask].tolist())
+            if (pos := positions.get(doc_id)) is not None
+        ]
         
         logger.info(f"Found {len(results)} relevant documents")
         return results
@@ -139,26 +470,20 @@ class ContextRetriever:
         Returns:
             Concatenated context from relevant documents
         """
+        self._ensure_loaded()
         results = self.search(query, top_k)
         
         if not results:
             return ""
         
-        context_parts = []
-        total_length = 0
+        # Cumulative lengths; the first document to reach max_length is cut short
+        cumulative = list(accumulate(doc.length for doc, _ in results))
+        cutoff = bisect_left(cumulative, max_length)
         
-        for doc, score in results:
-            content = doc.content
-            if total_length + len(content) > max_length:
-                # Truncate to fit max_length
-                remaining = max_length - total_length
-                content = content[:remaining]
-            
-            context_parts.append(content)
-            total_length += len(content)
-            
-            if total_length >= max_length:
-                break
+        context_parts = [doc.content for doc, _ in results[:cutoff + 1]]
+        if cutoff < len(results):
+            consumed = cumulative[cutoff - 1] if cutoff else 0
+            context_parts[-1] = context_parts[-1][:max_length - consumed]
         
         context = "\n\n".join(context_parts)
         logger.info(f"Retrieved context of length {len(context)}")
@@ -180,13 +505,31 @@ class ContextRetriever:
             logger.error("No save path provided")
             return
         
-        # Save FAISS index
-        faiss.write_index(self.index, save_path)
-        
-        # Save documents separately
         docs_path = save_path + ".docs"
-        with open(docs_path, 'wb') as f:
-            pickle.dump(self.documents, f)
+        
+        # Write both files to temporaries, then swap them in under the lock so
+        # readers never observe a partially written index or sidecar
+        with _index_lock(save_path):
+            # Save FAISS index
+            faiss.write_index(self.index, save_path + ".tmp")
+            
+            # Save documents separately
+            with open(docs_path + ".tmp", 'wb') as f:
+                if msgpack is not None:
+                    msgpack.pack(
+                        list(zip(self._contents, self._metadata)),
+                        f,
+                        use_bin_type=True
+                    )
+                else:
+                    logger.debug("msgpack not installed, saving documents with pickle")
+                    pickle.dump(self.documents, f)
+            
+            _fsync_replace(save_path + ".tmp", save_path)
+            _fsync_replace(docs_path + ".tmp", docs_path)
+        
+        if save_path == self.index_path:
+            self._index_dirty = False
         
         logger.info(f"Saved index to {save_path}")
     
@@ -206,21 +549,46 @@ class ContextRetriever:
             logger.warning(f"Index file not found: {load_path}")
             return
         
-        # Load FAISS index
-        self.index = faiss.read_index(load_path)
+        with _index_lock(load_path, exclusive=False):
+            # Load FAISS index
+            self.index = faiss.read_index(load_path)
+            
+            # Load documents
+            docs_path = load_path + ".docs"
+            if os.path.exists(docs_path):
+                self.documents = self._load_documents(docs_path)
+        self._sync_ids_from_index()
         
-        # Load documents
-        docs_path = load_path + ".docs"
-        if os.path.exists(docs_path):
-            with open(docs_path, 'rb') as f:
-                self.documents = pickle.load(f)
+        self._index_dirty = load_path != self.index_path
         
-        logger.info(f"Loaded index from {load_path} with {len(self.documents)} documents")
+        logger.info(f"Loaded index from {load_path} with {len(self._contents)} documents")
+    
+    @staticmethod
+    def _load_documents(docs_path: str) -> List[Document]:
+        """Read a documents sidecar written as msgpack or (legacy) pickle."""
+        with open(docs_path, 'rb') as f:
+            # Pickle protocol 2+ always starts with the PROTO opcode
+            if f.read(1) == b'\x80':
+                f.seek(0)
+                return pickle.load(f)
+            f.seek(0)
+            if msgpack is None:
+                raise ImportError(
+                    "msgpack is required to read this index. "
+                    "Install with: pip install msgpack"
+                )
+            return [
+                Document(content, metadata)
+                for content, metadata in msgpack.unpack(f, raw=False)
+            ]
     
     def clear(self):
         """Clear all documents and reset index."""
         self.index = None
-        self.documents = []
+        self._contents = []
+        self._metadata = []
+        self._set_ids([])
+        self._index_dirty = False
         logger.info("Cleared index and documents")
 
 
@@ -4,22 +4,189 @@ Handles document loading, chunking, and embedding for FAISS index.
 """
 
 import os
+import hashlib
 import logging
-from typing import List, Dict, Any, Optional
-from dataclasses import dataclass
-import re
+import random
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import lru_cache
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Tuple, Mapping, Union
+from collections import ChainMap
+from dataclasses import dataclass, replace
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    def njit(*args, **kwargs):
+        """Fallback when numba is not installed: run the kernel as plain Python."""
+        def decorator(func):
+            return func
+        return decorator
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
 
 logger = logging.getLogger(__name__)
 
+# Characters read per block when streaming files into the chunker
+FILE_READ_BLOCK_SIZE = 65536
+
+# Per-paragraph decisions returned by _compute_cut_kinds
+_APPEND = 0  # paragraph joins the current chunk
+_EMIT = 1    # current chunk is emitted first; paragraph starts the next (after overlap)
+_SPLIT = 2   # paragraph alone exceeds chunk_size and is split by sentences
+
+
+@njit(cache=True, nogil=True)
+def _compute_cut_kinds(lens, chunk_size, sep_len, overlap, current_len):
+    """
+    Decide where chunking cuts, using only paragraph lengths.
+    
+    Mirrors the greedy packing in DocumentChunker.chunk_stream: the running
+    length includes separators and the overlap carried into each new chunk.
+    current_len is the length of the chunk being filled when lens starts, so
+    a document can be processed in batches; the updated value is returned
+    alongside the per-paragraph decisions.
+    """
+    n = len(lens)
+    kinds = np.zeros(n, dtype=np.int8)
+    for i in range(n):
+        length = lens[i]
+        if current_len + length + sep_len > chunk_size:
+            if current_len:
+                kinds[i] = _EMIT
+                if overlap > 0:
+                    current_len = min(overlap, current_len) + sep_len + length
+                else:
+                    current_len = length
+            else:
+                kinds[i] = _SPLIT
+                current_len = 0
+        elif current_len:
+            current_len += sep_len + length
+        else:
+            current_len = length
+    return kinds, current_len
+
+
+def _scan_paragraphs(
+    text: str,
+    separator: str,
+    final: bool = True
+) -> Tuple[List[Tuple[int, int]], int]:
+    """
+    Find the (start, end) offsets of each non-empty paragraph in text.
+    
+    Walks text once with str.find and trims surrounding whitespace by moving
+    the offsets, so paragraphs are only copied out when they are used.
+    Equivalent to [p.strip() for p in text.split(separator) if p.strip()].
+    
+    Args:
+        text: Text to scan
+        separator: Paragraph separator
+        final: Whether text runs to the end of the document. If False, the
+            segment after the last separator is left unscanned because the
+            next block may extend it.
+            
+    Returns:
+        Tuple of (paragraph spans, number of characters consumed)
+    """
+    if not separator:
+        raise ValueError("empty separator")
+    
+    step = len(separator)
+    text_len = len(text)
+    spans = []
+    pos = 0
+    
+    while pos <= text_len:
+        end = text.find(separator, pos)
+        if end < 0:
+            if not final:
+                break
+            end = text_len
+        next_pos = end + step
+        
+        start = pos
+        while start < end and text[start].isspace():
+            start += 1
+        while end > start and text[end - 1].isspace():
+            end -= 1
+        if start < end:
+            spans.append((start, end))
+        
+        pos = next_pos
+    
+    return spans, min(pos, text_len)
+
+
+def _split_sentences(paragraph: str) -> List[str]:
+    r"""
+    Split paragraph at whitespace runs that follow terminal punctuation.
+    
+    Equivalent to re.split(r'(?<=[.!?])\s+', paragraph), but jumps between
+    punctuation marks with str.find instead of trying the lookbehind at
+    every character.
+    """
+    find = paragraph.find
+    text_len = len(paragraph)
+    # Next position of each punctuation mark, -1 once exhausted
+    next_period, next_bang, next_question = find('.'), find('!'), find('?')
+    sentences = []
+    start = 0
+    
+    while True:
+        pos = next_period
+        if next_bang >= 0 and (pos < 0 or next_bang < pos):
+            pos = next_bang
+        if next_question >= 0 and (pos < 0 or next_question < pos):
+            pos = next_question
+        if pos < 0:
+            break
+        
+        mark = paragraph[pos]
+        if mark == '.':
+            next_period = find('.', pos + 1)
+        elif mark == '!':
+            next_bang = find('!', pos + 1)
+        else:
+            next_question = find('?', pos + 1)
+        
+        end = pos + 1
+        while end < text_len and paragraph[end].isspace():
+            end += 1
+        if end > pos + 1:
+            sentences.append(paragraph[start:pos + 1])
+            start = end
+    
+    sentences.append(paragraph[start:])
+    return sentences
+
 
 @dataclass
 class DocumentChunk:
-    """Represents a chunk of a document."""
+    """
+    Represents a chunk of a document.
+    
+    All chunks of a source share one base_metadata mapping; only the chunk
+    index is stored per chunk.
+    """
+    # Declared by hand rather than dataclass(slots=True) to keep Python 3.9 support
+    __slots__ = ('content', 'base_metadata', 'chunk_index', 'chunk_id', 'source')
+    
     content: str
-    metadata: Dict[str, Any]
+    base_metadata: Mapping[str, Any]
+    chunk_index: int
     chunk_id: str
     source: str
     
+    @property
+    def metadata(self) -> Mapping[str, Any]:
+        """Metadata for this chunk: the shared base plus its chunk_index."""
+        return ChainMap({'chunk_index': self.chunk_index}, self.base_metadata)
+    
     def __repr__(self):
         return f"DocumentChunk(id={self.chunk_id}, source={self.source}, len={len(self.content)})"
 
@@ -64,71 +231,121 @@ class DocumentChunker:
             logger.warning(f"Empty text provided for source: {source}")
             return []
         
-        # Initialize metadata
-        base_metadata = metadata or {}
-        base_metadata['source'] = source
+        return list(self.chunk_stream((text,), source, metadata))
+    
+    def chunk_stream(
+        self,
+        blocks: Iterable[str],
+        source: str,
+        metadata: Optional[Dict] = None
+    ) -> Iterator[DocumentChunk]:
+        """
+        Chunk a document that arrives as a sequence of text blocks.
+        
+        Produces the same chunks as chunk_text on the concatenated blocks,
+        but only holds the unfinished paragraph and the chunk being filled,
+        so memory stays bounded by chunk_size rather than the document size.
         
-        # Split by primary separator first
-        paragraphs = text.split(self.separator)
+        Args:
+            blocks: Iterable of consecutive pieces of the document text
+            source: Source identifier (filename, URL, etc.)
+            metadata: Additional metadata to attach to chunks
+            
+        Yields:
+            DocumentChunk objects in document order
+        """
+        # Metadata shared by every chunk of this source
+        base_metadata = {**(metadata or {}), 'source': source}
+        # Bind settings to locals once; they are read on every paragraph
+        chunk_size = self.chunk_size
+        overlap = self.chunk_overlap
+        separator = self.separator
+        sep_len = len(separator)
         
-        chunks = []
-        current_chunk = ""
         chunk_index = 0
+        current_len = 0
+        # Paragraphs of the chunk being filled, and the overlap it starts with
+        pending: List[str] = []
+        overlap_text = None
+        tail = ""
         
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if not paragraph:
+        blocks = iter(blocks)
+        final = False
+        while not final:
+            block = next(blocks, None)
+            final = block is None
+            text = tail if final else tail + block
+            
+            # Locate complete paragraphs by offset; an unterminated trailing
+            # paragraph is carried into the next block
+            spans, consumed = _scan_paragraphs(text, separator, final)
+            tail = text[consumed:]
+            if not spans:
                 continue
             
-            # If adding this paragraph exceeds chunk_size
-            if len(current_chunk) + len(paragraph) + len(self.separator) > self.chunk_size:
-                if current_chunk:
+            bounds = np.array(spans, dtype=np.int64)
+            
+            # The length arithmetic runs in a compiled kernel; Python only
+            # joins paragraphs between the cut points it reports
+            kinds, current_len = _compute_cut_kinds(
+                bounds[:, 1] - bounds[:, 0], chunk_size, sep_len, overlap, current_len
+            )
+            
+            start = 0
+            for i in np.flatnonzero(kinds).tolist():
+                if kinds[i] == _EMIT:
                     # Save current chunk
+                    parts = pending + [text[s:e] for s, e in spans[start:i]]
+                    if overlap_text is not None:
+                        parts.insert(0, overlap_text)
+                    current_chunk = separator.join(parts)
                     chunk_id = f"{source}_chunk_{chunk_index}"
-                    chunk_metadata = {**base_metadata, 'chunk_index': chunk_index}
                     
-                    chunks.append(DocumentChunk(
+                    yield DocumentChunk(
                         content=current_chunk.strip(),
-                        metadata=chunk_metadata,
+                        base_metadata=base_metadata,
+                        chunk_index=chunk_index,
                         chunk_id=chunk_id,
                         source=source
-                    ))
+                    )
                     
                     chunk_index += 1
                     
                     # Start new chunk with overlap
-                    if self.chunk_overlap > 0:
-                        overlap_text = current_chunk[-self.chunk_overlap:]
-                        current_chunk = overlap_text + self.separator + paragraph
-                    else:
-                        current_chunk = paragraph
+                    overlap_text = current_chunk[-overlap:] if overlap > 0 else None
+                    start = i
                 else:
                     # Paragraph itself is larger than chunk_size, split it
-                    sub_chunks = self._split_large_paragraph(paragraph, source, chunk_index, base_metadata)
-                    chunks.extend(sub_chunks)
-                    chunk_index += len(sub_chunks)
-                    current_chunk = ""
-            else:
-                # Add paragraph to current chunk
-                if current_chunk:
-                    current_chunk += self.separator + paragraph
-                else:
-                    current_chunk = paragraph
+                    para_start, para_end = spans[i]
+                    chunk_index = yield from self._split_large_paragraph(
+                        text[para_start:para_end], source, chunk_index, base_metadata
+                    )
+                    start = i + 1
+                    overlap_text = None
+                pending = []
+            
+            # Only the paragraphs of the unfinished chunk are copied out
+            pending.extend(text[s:e] for s, e in spans[start:])
         
         # Add final chunk
-        if current_chunk:
+        if pending:
+            if overlap_text is not None:
+                pending.insert(0, overlap_text)
             chunk_id = f"{source}_chunk_{chunk_index}"
-            chunk_metadata = {**base_metadata, 'chunk_index': chunk_index}
             
-            chunks.append(DocumentChunk(
-                content=current_chunk.strip(),
-                metadata=chunk_metadata,
+            yield DocumentChunk(
+                content=separator.join(pending).strip(),
+                base_metadata=base_metadata,
+                chunk_index=chunk_index,
                 chunk_id=chunk_id,
                 source=source
-            ))
+            )
+            chunk_index += 1
         
-        logger.info(f"Created {len(chunks)} chunks from {source}")
-        return chunks
+        if chunk_index:
+            logger.info(f"Created {chunk_index} chunks from {source}")
+        else:
+            logger.warning(f"Empty text provided for source: {source}")
     
     def _split_large_paragraph(
         self,
@@ -136,51 +353,67 @@ class DocumentChunker:
         source: str,
         start_index: int,
         base_metadata: Dict
-    ) -> List[DocumentChunk]:
-        """Split a large paragraph into chunks by sentences."""
+    ) -> Iterator[DocumentChunk]:
+        """
+        Split a large paragraph into chunks by sentences.
+        
+        Yields the chunks and returns the chunk index after the last one.
+        """
+        chunk_size = self.chunk_size
+        
+        # Without terminal punctuation the whole paragraph is one oversized
+        # "sentence", so go straight to word splitting and skip the scan
+        if len(paragraph) > chunk_size and not (
+            '.' in paragraph or '!' in paragraph or '?' in paragraph
+        ):
+            return (yield from self._split_by_words(paragraph, source, start_index, base_metadata))
         
         # Split by sentences
-        sentences = re.split(r'(?<=[.!?])\s+', paragraph)
+        sentences = _split_sentences(paragraph)
         
-        chunks = []
-        current_chunk = ""
+        current_parts: List[str] = []
+        current_len = 0
         chunk_index = start_index
         
         for sentence in sentences:
-            if len(current_chunk) + len(sentence) > self.chunk_size:
-                if current_chunk:
+            if current_len + len(sentence) > chunk_size:
+                if current_len:
                     chunk_id = f"{source}_chunk_{chunk_index}"
-                    chunk_metadata = {**base_metadata, 'chunk_index': chunk_index}
                     
-                    chunks.append(DocumentChunk(
-                        content=current_chunk.strip(),
-                        metadata=chunk_metadata,
+                    yield DocumentChunk(
+                        content=" ".join(current_parts).strip(),
+                        base_metadata=base_metadata,
+                        chunk_index=chunk_index,
                         chunk_id=chunk_id,
                         source=source
-                    ))
+                    )
                     
                     chunk_index += 1
-                    current_chunk = sentence
+                    current_parts = [sentence]
+                    current_len = len(sentence)
                 else:
                     # Single sentence is too large, split by words
-                    word_chunks = self._split_by_words(sentence, source, chunk_index, base_metadata)
-                    chunks.extend(word_chunks)
-                    chunk_index += len(word_chunks)
+                    chunk_index = yield from self._split_by_words(sentence, source, chunk_index, base_metadata)
+            elif current_len:
+                current_parts.append(sentence)
+                current_len += 1 + len(sentence)
             else:
-                current_chunk += " " + sentence if current_chunk else sentence
+                current_parts = [sentence]
+                current_len = len(sentence)
         
-        if current_chunk:
+        if current_len:
             chunk_id = f"{source}_chunk_{chunk_index}"
-            chunk_metadata = {**base_metadata, 'chunk_index': chunk_index}
             
-            chunks.append(DocumentChunk(
-                content=current_chunk.strip(),
-                metadata=chunk_metadata,
+            yield DocumentChunk(
+                content=" ".join(current_parts).strip(),
+                base_metadata=base_metadata,
+                chunk_index=chunk_index,
                 chunk_id=chunk_id,
                 source=source
-            ))
+            )
+            chunk_index += 1
         
-        return chunks
+        return chunk_index
     
     def _split_by_words(
         self,
@@ -188,94 +421,463 @@ class DocumentChunker:
         source: str,
         start_index: int,
         base_metadata: Dict
-    ) -> List[DocumentChunk]:
-        """Split text by words as last resort."""
+    ) -> Iterator[DocumentChunk]:
+        """
+        Split text by words as last resort.
+        
+        Yields the chunks and returns the chunk index after the last one.
+        """
+        chunk_size = self.chunk_size
         
         words = text.split()
-        chunks = []
-        current_chunk = ""
+        current_parts: List[str] = []
+        current_len = 0
         chunk_index = start_index
         
         for word in words:
-            if len(current_chunk) + len(word) + 1 > self.chunk_size:
-                if current_chunk:
+            if current_len + len(word) + 1 > chunk_size:
+                if current_len:
                     chunk_id = f"{source}_chunk_{chunk_index}"
-                    chunk_metadata = {**base_metadata, 'chunk_index': chunk_index}
                     
-                    chunks.append(DocumentChunk(
-                        content=current_chunk.strip(),
-                        metadata=chunk_metadata,
+                    yield DocumentChunk(
+                        content=" ".join(current_parts).strip(),
+                        base_metadata=base_metadata,
+                        chunk_index=chunk_index,
                         chunk_id=chunk_id,
                         source=source
-                    ))
+                    )
                     
                     chunk_index += 1
-                    current_chunk = word
+                    current_parts = [word]
+                    current_len = len(word)
                 else:
                     # Single word is too large, truncate
                     chunk_id = f"{source}_chunk_{chunk_index}"
-                    chunk_metadata = {**base_metadata, 'chunk_index': chunk_index}
                     
-                    chunks.append(DocumentChunk(
-                        content=word[:self.chunk_size],
-                        metadata=chunk_metadata,
+                    yield DocumentChunk(
+                        content=word[:chunk_size],
+                        base_metadata=base_metadata,
+                        chunk_index=chunk_index,
                         chunk_id=chunk_id,
                         source=source
-                    ))
+                    )
                     chunk_index += 1
+            elif current_len:
+                current_parts.append(word)
+                current_len += 1 + len(word)
             else:
-                current_chunk += " " + word if current_chunk else word
+                current_parts = [word]
+                current_len = len(word)
         
-        if current_chunk:
+        if current_len:
             chunk_id = f"{source}_chunk_{chunk_index}"
-            chunk_metadata = {**base_metadata, 'chunk_index': chunk_index}
             
-            chunks.append(DocumentChunk(
-                content=current_chunk.strip(),
-                metadata=chunk_metadata,
+            yield DocumentChunk(
+                content=" ".join(current_parts).strip(),
+                base_metadata=base_metadata,
+                chunk_index=chunk_index,
                 chunk_id=chunk_id,
                 source=source
-            ))
+            )
+            chunk_index += 1
         
-        return chunks
+        return chunk_index
+
+
+# Gear hash state is kept to 32 bits; only its top bits are tested, and bit k
+# depends on just the last k + 1 bytes, so this gives a 32-byte window
+_GEAR_BITS = 32
+_GEAR_MASK = (1 << _GEAR_BITS) - 1
+# Fixed seed so chunk boundaries are stable across runs and machines
+_gear_rng = random.Random(0x9E3779B9)
+_GEAR_TABLE = np.array([_gear_rng.getrandbits(_GEAR_BITS) for _ in range(256)], dtype=np.int64)
+del _gear_rng
+
+
+@njit(cache=True, nogil=True)
+def _gear_cut_points(data, gear, mask, min_size, max_size):
+    """
+    Find content-defined cut offsets in a UTF-8 byte array.
+    
+    A cut is placed after byte i once the chunk has at least min_size bytes
+    and either the rolling hash matches mask or the chunk reaches max_size.
+    Cuts only land on character boundaries, and never at the very end of
+    data, so a caller can append more bytes and resume from the last cut.
+    """
+    n = len(data)
+    cuts = np.empty(n // min_size + 1, dtype=np.int64)
+    count = 0
+    start = 0
+    h = 0
+    for i in range(n - 1):
+        h = ((h << 1) + gear[data[i]]) & _GEAR_MASK
+        size = i + 1 - start
+        if size >= min_size and ((h & mask) == 0 or size >= max_size) and (data[i + 1] & 0xC0) != 0x80:
+            cuts[count] = i + 1
+            count += 1
+            start = i + 1
+            h = 0
+    return cuts[:count]
+
+
+class CDCChunker:
+    """
+    Content-defined chunker for corpora with repeated boilerplate.
+    
+    Boundaries are chosen by a Gear rolling hash over the bytes rather than
+    by position, so identical passages (headers, footers, license text)
+    produce identical chunks wherever they appear, and an edit only moves
+    the boundaries next to it. Chunks whose content was already emitted by
+    this chunker are dropped, so duplicates are never embedded or indexed.
+    
+    Deduplication spans every call on the same instance; use it with
+    DocumentLoader's default thread pool rather than use_processes=True,
+    where each worker process would keep its own record.
+    """
+    
+    def __init__(
+        self,
+        min_size: int = 128,
+        avg_size: int = 512,
+        max_size: int = 1024,
+        dedupe: bool = True
+    ):
+        """
+        Initialize content-defined chunker.
+        
+        Args:
+            min_size: Minimum chunk size in bytes (UTF-8)
+            avg_size: Target average chunk size in bytes
+            max_size: Maximum chunk size in bytes (exceeded only to finish a character)
+            dedupe: Drop chunks whose content has already been emitted
+        """
+        if not 0 < min_size < avg_size <= max_size:
+            raise ValueError("CDCChunker requires 0 < min_size < avg_size <= max_size")
+        
+        self.min_size = min_size
+        self.avg_size = avg_size
+        self.max_size = max_size
+        self.dedupe = dedupe
+        # Cuts happen on average every 2**bits bytes after min_size
+        bits = max(1, (avg_size - min_size).bit_length() - 1)
+        self._mask = ((1 << bits) - 1) << (_GEAR_BITS - bits)
+        # Digest of each emitted chunk -> the marker of the chunk that claimed it
+        self._seen: Dict[bytes, object] = {}
+    
+    def reset(self):
+        """Forget previously emitted chunks so they are no longer deduplicated."""
+        self._seen.clear()
+    
+    def chunk_text(self, text: str, source: str, metadata: Optional[Dict] = None) -> List[DocumentChunk]:
+        """
+        Chunk a text document at content-defined boundaries.
+        
+        Args:
+            text: Full text to chunk
+            source: Source identifier (filename, URL, etc.)
+            metadata: Additional metadata to attach to chunks
+            
+        Returns:
+            List of DocumentChunk objects, without already-seen duplicates
+        """
+        if not text or not text.strip():
+            logger.warning(f"Empty text provided for source: {source}")
+            return []
+        
+        return list(self.chunk_stream((text,), source, metadata))
+    
+    def chunk_stream(
+        self,
+        blocks: Iterable[str],
+        source: str,
+        metadata: Optional[Dict] = None
+    ) -> Iterator[DocumentChunk]:
+        """
+        Chunk a document that arrives as a sequence of text blocks.
+        
+        The hash restarts at every cut, so carrying the bytes after the last
+        cut into the next block gives the same chunks as one large block.
+        
+        Args:
+            blocks: Iterable of consecutive pieces of the document text
+            source: Source identifier (filename, URL, etc.)
+            metadata: Additional metadata to attach to chunks
+            
+        Yields:
+            DocumentChunk objects in document order
+        """
+        base_metadata = {**(metadata or {}), 'source': source}
+        chunk_index = 0
+        duplicates = 0
+        tail = b""
+        
+        blocks = iter(blocks)
+        final = False
+        while not final:
+            block = next(blocks, None)
+            final = block is None
+            data = tail if final else tail + block.encode('utf-8')
+            if not data:
+                continue
+            
+            cuts = _gear_cut_points(
+                np.frombuffer(data, dtype=np.uint8), _GEAR_TABLE,
+                self._mask, self.min_size, self.max_size
+            ).tolist()
+            if final:
+                cuts.append(len(data))
+            
+            start = 0
+            for end in cuts:
+                piece = data[start:end]
+                start = end
+                
+                content = piece.decode('utf-8').strip()
+                if not content:
+                    continue
+                if self.dedupe:
+                    digest = hashlib.blake2b(content.encode('utf-8'), digest_size=16).digest()
+                    # setdefault is a single atomic step, so two loader threads
+                    # can't both claim the same content
+                    marker = object()
+                    if self._seen.setdefault(digest, marker) is not marker:
+                        duplicates += 1
+                        continue
+                
+                yield DocumentChunk(
+                    content=content,
+                    base_metadata=base_metadata,
+                    chunk_index=chunk_index,
+                    chunk_id=f"{source}_chunk_{chunk_index}",
+                    source=source
+                )
+                chunk_index += 1
+            
+            tail = data[start:]
+        
+        logger.info(f"Created {chunk_index} chunks from {source} ({duplicates} duplicates skipped)")
+
+
+class TokenChunker:
+    """
+    Chunks documents by token count rather than characters.
+    
+    Embedding models truncate by tokens, so sizing chunks in tokens keeps
+    them within the model's budget. The text is encoded once with a
+    tiktoken BPE encoding and sliced into overlapping token windows, which
+    are decoded back to text in one batch call.
+    """
+    
+    def __init__(
+        self,
+        chunk_size: int = 256,
+        chunk_overlap: int = 32,
+        encoding_name: str = "cl100k_base"
+    ):
+        """
+        Initialize token chunker.
+        
+        Args:
+            chunk_size: Tokens per chunk
+            chunk_overlap: Tokens shared by consecutive chunks
+            encoding_name: tiktoken encoding used to count tokens
+        """
+        if tiktoken is None:
+            raise ImportError(
+                "tiktoken is required for TokenChunker. "
+                "Install with: pip install tiktoken"
+            )
+        if not 0 <= chunk_overlap < chunk_size:
+            raise ValueError("TokenChunker requires 0 <= chunk_overlap < chunk_size")
+        
+        self.chunk_size = chunk_size
+        self.chunk_overlap = chunk_overlap
+        self.encoding_name = encoding_name
+        self.encoding = tiktoken.get_encoding(encoding_name)
+    
+    def __getstate__(self) -> Dict[str, Any]:
+        """Pickle settings only; the encoding is reloaded by name."""
+        return {
+            'chunk_size': self.chunk_size,
+            'chunk_overlap': self.chunk_overlap,
+            'encoding_name': self.encoding_name,
+        }
+    
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__dict__.update(state)
+        self.encoding = tiktoken.get_encoding(self.encoding_name)
+    
+    def chunk_text(self, text: str, source: str, metadata: Optional[Dict] = None) -> List[DocumentChunk]:
+        """
+        Chunk a text document into token windows.
+        
+        Args:
+            text: Full text to chunk
+            source: Source identifier (filename, URL, etc.)
+            metadata: Additional metadata to attach to chunks
+            
+        Returns:
+            List of DocumentChunk objects
+        """
+        if not text or not text.strip():
+            logger.warning(f"Empty text provided for source: {source}")
+            return []
+        
+        return list(self.chunk_stream((text,), source, metadata))
+    
+    def chunk_stream(
+        self,
+        blocks: Iterable[str],
+        source: str,
+        metadata: Optional[Dict] = None
+    ) -> Iterator[DocumentChunk]:
+        """
+        Chunk a document that arrives as a sequence of text blocks.
+        
+        BPE merges can span block boundaries, so the blocks are joined and
+        encoded in a single call before windowing.
+        
+        Args:
+            blocks: Iterable of consecutive pieces of the document text
+            source: Source identifier (filename, URL, etc.)
+            metadata: Additional metadata to attach to chunks
+            
+        Yields:
+            DocumentChunk objects in document order
+        """
+        base_metadata = {**(metadata or {}), 'source': source}
+        chunk_size = self.chunk_size
+        overlap = self.chunk_overlap
+        
+        # Special-token text in documents is treated as ordinary text
+        token_ids = self.encoding.encode_ordinary("".join(blocks))
+        
+        # Stop before a window that would only repeat the previous overlap
+        windows = [
+            token_ids[start:start + chunk_size]
+            for start in range(0, max(len(token_ids) - overlap, 1), chunk_size - overlap)
+        ]
+        
+        chunk_index = 0
+        for content in self.encoding.decode_batch(windows):
+            content = content.strip()
+            if not content:
+                continue
+            
+            yield DocumentChunk(
+                content=content,
+                base_metadata=base_metadata,
+                chunk_index=chunk_index,
+                chunk_id=f"{source}_chunk_{chunk_index}",
+                source=source
+            )
+            chunk_index += 1
+        
+        logger.info(f"Created {chunk_index} chunks from {source} ({len(token_ids)} tokens)")
+
+
+def _iter_files(directory: str, extensions: frozenset) -> Iterator[str]:
+    """
+    Yield paths of files under directory whose extension is in extensions.
+    
+    Uses os.scandir so entry types come from the directory listing instead
+    of extra stat calls. Like os.walk, a directory's files come before its
+    subdirectories and symlinked directories are not followed.
+    """
+    subdirs = []
+    try:
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir():
+                    if not entry.is_symlink():
+                        subdirs.append(entry.path)
+                    continue
+                name = entry.name
+                dot = name.rfind('.')
+                if dot >= 0 and name[dot:].lower() in extensions:
+                    yield entry.path
+    except OSError as e:
+        logger.warning(f"Cannot read directory {directory}: {e}")
+        return
+    
+    for subdir in subdirs:
+        yield from _iter_files(subdir, extensions)
 
 
 class DocumentLoader:
     """Loads documents from various sources."""
     
-    def __init__(self, chunker: DocumentChunker):
+    def __init__(self, chunker: Union[DocumentChunker, CDCChunker, TokenChunker]):
         self.chunker = chunker
     
     def load_from_directory(
         self,
         directory: str,
-        extensions: List[str] = ['.txt', '.md']
+        extensions: List[str] = ['.txt', '.md'],
+        max_workers: Optional[int] = None,
+        use_processes: bool = False
     ) -> List[DocumentChunk]:
         """
         Load and chunk all documents from a directory.
         
         Args:
             directory: Path to directory containing documents
-            extensions: File extensions to process
+            extensions: File extensions to process (matched case-insensitively)
+            max_workers: Pool size (defaults to 32 threads or one process per CPU)
+            use_processes: Chunk files in a process pool instead of threads
             
         Returns:
-            List of DocumentChunk objects
+            List of DocumentChunk objects, in directory walk order
         """
-        all_chunks = []
+        all_chunks = list(self.iter_directory(directory, extensions, max_workers, use_processes))
+        logger.info(f"Loaded {len(all_chunks)} chunks from {directory}")
+        return all_chunks
+    
+    def iter_directory(
+        self,
+        directory: str,
+        extensions: List[str] = ['.txt', '.md'],
+        max_workers: Optional[int] = None,
+        use_processes: bool = False
+    ) -> Iterator[DocumentChunk]:
+        """
+        Load and chunk documents from a directory, yielding chunks as each file finishes.
         
+        Files are independent, so they are loaded concurrently. Threads suit
+        I/O-bound sources such as network mounts or DBFS; processes suit
+        large local corpora where chunking dominates. Consumers can start
+        embedding the first files while later ones are still being chunked.
+        
+        Args:
+            directory: Path to directory containing documents
+            extensions: File extensions to process (matched case-insensitively)
+            max_workers: Pool size (defaults to 32 threads or one process per CPU)
+            use_processes: Chunk files in a process pool instead of threads
+            
+        Yields:
+            DocumentChunk objects, in directory walk order
+        """
         if not os.path.exists(directory):
             logger.warning(f"Directory not found: {directory}")
-            return all_chunks
+            return
         
-        for root, dirs, files in os.walk(directory):
-            for file in files:
-                if any(file.endswith(ext) for ext in extensions):
-                    file_path = os.path.join(root, file)
-                    chunks = self.load_from_file(file_path)
-                    all_chunks.extend(chunks)
+        file_paths = list(_iter_files(directory, frozenset(ext.lower() for ext in extensions)))
         
-        logger.info(f"Loaded {len(all_chunks)} chunks from {directory}")
-        return all_chunks
+        if len(file_paths) <= 1:
+            for file_path in file_paths:
+                yield from self.load_from_file(file_path)
+            return
+        
+        if use_processes:
+            executor = ProcessPoolExecutor(max_workers=max_workers or os.cpu_count())
+            map_kwargs = {'chunksize': 8}
+        else:
+            executor = ThreadPoolExecutor(max_workers=max_workers or 32)
+            map_kwargs = {}
+        
+        with executor:
+            for chunks in executor.map(self.load_from_file, file_paths, **map_kwargs):
+                yield from chunks
     
     def load_from_file(self, file_path: str) -> List[DocumentChunk]:
         """
@@ -288,16 +890,16 @@ class DocumentLoader:
             List of DocumentChunk objects
         """
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                text = f.read()
-            
             filename = os.path.basename(file_path)
             metadata = {
                 'file_path': file_path,
                 'filename': filename
             }
             
-            chunks = self.chunker.chunk_text(text, source=filename, metadata=metadata)
+            # Read in fixed-size blocks so the whole file is never in memory
+            with open(file_path, 'r', encoding='utf-8') as f:
+                blocks = iter(lambda: f.read(FILE_READ_BLOCK_SIZE), '')
+                chunks = list(self.chunker.chunk_stream(blocks, source=filename, metadata=metadata))
             return chunks
             
         except Exception as e:
@@ -330,9 +932,28 @@ def create_knowledge_base_documents() -> List[DocumentChunk]:
     Create sample knowledge base documents for the agent.
     These documents provide context about business metrics, KPIs, and definitions.
     
+    The documents are fixed, so they are chunked once per process; each call
+    returns fresh copies of the cached chunks and their metadata, so callers
+    may modify them freely.
+    
     Returns:
         List of DocumentChunk objects
     """
+    # Copy each source's shared base_metadata once, keeping it shared
+    # between that source's copied chunks
+    base_copies: Dict[int, Dict[str, Any]] = {}
+    chunks = []
+    for chunk in _knowledge_base_chunks():
+        base = base_copies.get(id(chunk.base_metadata))
+        if base is None:
+            base = base_copies[id(chunk.base_metadata)] = dict(chunk.base_metadata)
+        chunks.append(replace(chunk, base_metadata=base))
+    return chunks
+
+
+@lru_cache(maxsize=1)
+def _knowledge_base_chunks() -> Tuple[DocumentChunk, ...]:
+    """Chunk the built-in knowledge base documents (cached)."""
     chunker = DocumentChunker(chunk_size=300, chunk_overlap=50)
     
     documents = [
@@ -434,4 +1055,4 @@ def create_knowledge_base_documents() -> List[DocumentChunk]:
         all_chunks.extend(chunks)
     
     logger.info(f"Created {len(all_chunks)} knowledge base chunks")
-    return all_chunks
+    return tuple(all_chunks)
@@ -3,13 +3,64 @@ LLM service for enhanced query understanding and response generation.
 Supports Mistral AI for natural language processing.
 """
 
+import asyncio
+import json
 import logging
 import os
-from typing import Optional, Dict, Any, List
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Optional, Dict, Any, List, Tuple
 from dataclasses import dataclass
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# First markdown code block in a model reply, with its optional language tag.
+# A bare word alone on the fence line only counts as a tag when it can't
+# open a statement, so "```SELECT\n..." keeps its SELECT. A closing fence
+# is optional so truncated replies still unwrap.
+_FENCE_RE = re.compile(
+    r"```(?:(?:sql|sparksql|json)\b"
+    r"|(?!(?:select|with|from|show|describe|explain|values|insert|update|delete|merge|create)\b)"
+    r"[\w+-]*(?=[ \t]*\n))?\s*(.*?)(?:```|\Z)",
+    re.DOTALL | re.IGNORECASE
+)
+
+_JSON_DECODER = json.JSONDecoder()
+
+# "-- Query N" header that opens each answer in a batched SQL reply
+_BATCH_MARKER_RE = re.compile(r"^[ \t]*--[ \t]*Query[ \t]+(\d+)[ \t]*:?[ \t]*$", re.MULTILINE | re.IGNORECASE)
+
+
+def _parse_json_object(content: str) -> Any:
+    """
+    Parse the first JSON object in a model reply.
+    
+    Markdown fences and prose around the object are skipped. The slice from
+    the first '{' to the last '}' is tried with orjson when installed;
+    otherwise, or if prose after the object contains braces, the stdlib
+    decoder reads exactly one object and ignores what follows.
+    """
+    start = content.find('{')
+    if start < 0:
+        raise ValueError("No JSON object found in response")
+    
+    if orjson is not None:
+        try:
+            return orjson.loads(content[start:content.rfind('}') + 1])
+        except orjson.JSONDecodeError:
+            pass
+    
+    value, _ = _JSON_DECODER.raw_decode(content, start)
+    return value
+
 
 @dataclass
 class LLMResponse:
@@ -29,7 +80,8 @@ class MistralLLMService:
         api_key: str,
         model: str = "mistral-large-latest",
         temperature: float = 0.1,
-        max_tokens: int = 2000
+        max_tokens: int = 2000,
+        max_concurrent_requests: int = 4
     ):
         """
         Initialize Mistral AI service.
@@ -39,12 +91,23 @@ class MistralLLMService:
             model: Model to use (mistral-large-latest, mistral-medium, mistral-small, etc.)
             temperature: Sampling temperature (0-1)
             max_tokens: Maximum tokens in response
+            max_concurrent_requests: Upper bound on requests in flight at
+                once, across all threads and event loops using this service
         """
         self.api_key = api_key
         self.model = model
         self.temperature = temperature
         self.max_tokens = max_tokens
+        self.max_concurrent_requests = max_concurrent_requests
         self.client = None
+        # A thread-level semaphore rather than asyncio.Semaphore: each
+        # Streamlit session runs its own event loop, and an asyncio
+        # semaphore only bounds the coroutines of the loop it belongs to
+        self._request_slots = threading.BoundedSemaphore(max_concurrent_requests)
+        # Async waiters block on this thread rather than the loop's default
+        # pool, which the agent needs for SQL execution; one thread suffices
+        # since slots are handed out one at a time
+        self._slot_waiter = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mistral-slot")
         
         # Initialize Mistral client (using new API)
         try:
@@ -78,32 +141,54 @@ class MistralLLMService:
         prompt = self._build_sql_generation_prompt(user_query, schema_info, context)
         
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are an expert SQL query generator for Databricks. Generate only valid SQL queries without explanations."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+            with self._request_slots:
+                response = self.client.chat.complete(
+                    model=self.model,
+                    messages=self._build_sql_messages(prompt),
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
             
-            response = self.client.chat.complete(
-                model=self.model,
-                messages=messages,
-                temperature=self.temperature,
-                max_tokens=self.max_tokens
-            )
+            sql = self._extract_sql(response.choices[0].message.content)
+            logger.info(f"Generated SQL: {sql}")
+            return sql
             
-            sql = response.choices[0].message.content.strip()
+        except Exception as e:
+            logger.error(f"Failed to generate SQL with Mistral AI: {e}")
+            return None
+    
+    async def generate_sql_from_query_async(
+        self,
+        user_query: str,
+        schema_info: str,
+        context: Optional[str] = None
+    ) -> Optional[str]:
+        """
+        Async variant of generate_sql_from_query.
+        
+        Uses the client's async transport, so several requests can be in
+        flight at once over the same pooled connection.
+        
+        Args:
+            user_query: User's natural language query
+            schema_info: Database schema information
+            context: Additional context from knowledge base
             
-            # Extract SQL from markdown code blocks if present
-            if "```sql" in sql:
-                sql = sql.split("```sql")[1].split("```")[0].strip()
-            elif "```" in sql:
-                sql = sql.split("```")[1].split("```")[0].strip()
+        Returns:
+            Generated SQL query or None if failed
+        """
+        prompt = self._build_sql_generation_prompt(user_query, schema_info, context)
+        
+        try:
+            async with self._request_slot():
+                response = await self.client.chat.complete_async(
+                    model=self.model,
+                    messages=self._build_sql_messages(prompt),
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
             
+            sql = self._extract_sql(response.choices[0].message.content)
             logger.info(f"Generated SQL: {sql}")
             return sql
             
@@ -111,6 +196,72 @@ class MistralLLMService:
             logger.error(f"Failed to generate SQL with Mistral AI: {e}")
             return None
     
+    def generate_sql_for_questions(
+        self,
+        questions: List[Tuple[str, Optional[str]]],
+        schema_info: str
+    ) -> List[Optional[str]]:
+        """
+        Generate SQL for several questions with a single Mistral call.
+        
+        The questions are numbered in one prompt and the reply is split on
+        its "-- Query N" headers.
+        
+        Args:
+            questions: List of (user_query, context) pairs
+            schema_info: Database schema information shared by all questions
+            
+        Returns:
+            Generated SQL for each question, in input order; None marks a
+            question the reply did not answer
+            
+        Raises:
+            Exception: If the batched call itself fails, so callers fall back
+                once rather than retrying every question on its own
+        """
+        if len(questions) == 1:
+            user_query, context = questions[0]
+            return [self.generate_sql_from_query(user_query, schema_info, context)]
+        
+        prompt = self._build_batch_sql_prompt(questions, schema_info)
+        
+        try:
+            with self._request_slots:
+                response = self.client.chat.complete(
+                    model=self.model,
+                    messages=self._build_sql_messages(prompt),
+                    temperature=self.temperature,
+                    max_tokens=self.max_tokens
+                )
+        except Exception as e:
+            logger.error(f"Failed to generate batched SQL with Mistral AI: {e}")
+            raise
+        
+        sqls = self._split_batch_sql(response.choices[0].message.content, len(questions))
+        logger.info(f"Generated SQL for {sum(sql is not None for sql in sqls)}/{len(questions)} batched questions")
+        return sqls
+    
+    async def generate_batch(
+        self,
+        queries: List[Tuple[str, str]],
+        context: Optional[str] = None
+    ) -> List[Optional[str]]:
+        """
+        Generate SQL for several questions concurrently.
+        
+        Args:
+            queries: List of (user_query, schema_info) pairs
+            context: Additional context shared by all queries
+            
+        Returns:
+            Generated SQL (or None on failure) for each query, in input order
+        """
+        results = await asyncio.gather(*(
+            self.generate_sql_from_query_async(user_query, schema_info, context)
+            for user_query, schema_info in queries
+        ))
+        return list(results)
+    
     def generate_insights(
         self,
         user_query: str,
@@ -133,23 +284,51 @@ class MistralLLMService:
         prompt = self._build_insights_prompt(user_query, sql_query, results, context)
         
         try:
-            messages = [
-                {
-                    "role": "system",
-                    "content": "You are a business intelligence analyst. Provide clear, actionable insights from data."
-                },
-                {
-                    "role": "user",
-                    "content": prompt
-                }
-            ]
+            with self._request_slots:
+                response = self.client.chat.complete(
+                    model=self.model,
+                    messages=self._build_insights_messages(prompt),
+                    temperature=0.3,  # Slightly higher for creative insights
+                    max_tokens=self.max_tokens
+                )
             
-            response = self.client.chat.complete(
-                model=self.model,
-                messages=messages,
-                temperature=0.3,  # Slightly higher for creative insights
-                max_tokens=self.max_tokens
-            )
+            insights = response.choices[0].message.content.strip()
+            logger.info("Generated insights with Mistral AI")
+            return insights
+            
+        except Exception as e:
+            logger.error(f"Failed to generate insights with Mistral AI: {e}")
+            return self._generate_fallback_insights(user_query, results)
+    
+    async def generate_insights_async(
+        self,
+        user_query: str,
+        sql_query: Optional[str],
+        results: Optional[List[Dict[str, Any]]],
+        context: Optional[str]
+    ) -> str:
+        """
+        Async variant of generate_insights.
+        
+        Args:
+            user_query: Original user query
+            sql_query: SQL query that was executed
+            results: Query results
+            context: Retrieved context from knowledge base
+            
+        Returns:
+            Generated insights text
+        """
+        prompt = self._build_insights_prompt(user_query, sql_query, results, context)
+        
+        try:
+            async with self._request_slot():
+                response = await self.client.chat.complete_async(
+                    model=self.model,
+                    messages=self._build_insights_messages(prompt),
+                    temperature=0.3,  # Slightly higher for creative insights
+                    max_tokens=self.max_tokens
+                )
             
             insights = response.choices[0].message.content.strip()
             logger.info("Generated insights with Mistral AI")
@@ -176,32 +355,9 @@ class MistralLLMService:
         Returns:
             Dictionary with parsed intent
         """
-        prompt = f"""
-Analyze this user query and extract the intent:
-
-Query: {user_query}
-
-Available Schema:
-{schema_info}
-
-Context:
-{context if context else 'None'}
-
-Return a JSON object with:
-- table_name: which table to query
-- columns: list of columns needed (or null for all)
-- filters: dictionary of column: value filters
-- aggregations: dictionary of column: aggregation_function (COUNT, SUM, AVG, etc.)
-- group_by: list of columns to group by
-- order_by: list of [column, direction] pairs
-- limit: number of rows to return
-
-Return only valid JSON, no explanations.
-"""
+        prompt = self._build_intent_prompt(user_query, schema_info, context)
         
         try:
-            import json
-            
             messages = [
                 {
                     "role": "system",
@@ -213,22 +369,15 @@ Return only valid JSON, no explanations.
                 }
             ]
             
-            response = self.client.chat.complete(
-                model=self.model,
-                messages=messages,
-                temperature=0.0,  # Deterministic parsing
-                max_tokens=1000
-            )
-            
-            content = response.choices[0].message.content.strip()
-            
-            # Extract JSON from markdown if present
-            if "```json" in content:
-                content = content.split("```json")[1].split("```")[0].strip()
-            elif "```" in content:
-                content = content.split("```")[1].split("```")[0].strip()
+            with self._request_slots:
+                response = self.client.chat.complete(
+                    model=self.model,
+                    messages=messages,
+                    temperature=0.0,  # Deterministic parsing
+                    max_tokens=1000
+                )
             
-            intent = json.loads(content)
+            intent = _parse_json_object(response.choices[0].message.content)
             logger.info(f"Parsed query intent: {intent}")
             return intent
             
@@ -244,8 +393,134 @@ Return only valid JSON, no explanations.
                 'limit': None
             }
     
+    @asynccontextmanager
+    async def _request_slot(self):
+        """
+        Hold one of the max_concurrent_requests slots while a request runs.
+        
+        A free slot is taken without leaving the loop. Otherwise the blocking
+        acquire runs on the service's dedicated waiter thread, so the loop
+        keeps serving its other coroutines and waiters don't tie up the
+        default executor. If the waiter is cancelled first, the slot is
+        handed back as soon as the thread obtains it.
+        """
+        if self._request_slots.acquire(blocking=False):
+            try:
+                yield
+            finally:
+                self._request_slots.release()
+            return
+        
+        handoff = threading.Lock()
+        granted = False
+        abandoned = False
+        
+        def acquire():
+            nonlocal granted
+            self._request_slots.acquire()
+            with handoff:
+                if abandoned:
+                    self._request_slots.release()
+                else:
+                    granted = True
+        
+        try:
+            await asyncio.get_running_loop().run_in_executor(self._slot_waiter, acquire)
+        except asyncio.CancelledError:
+            with handoff:
+                abandoned = True
+                if granted:
+                    self._request_slots.release()
+            raise
+        
+        try:
+            yield
+        finally:
+            self._request_slots.release()
+    
+    @staticmethod
+    def _build_sql_messages(prompt: str) -> List[Dict[str, str]]:
+        """Build the chat messages for SQL generation."""
+        return [
+            {
+                "role": "system",
+                "content": "You are an expert SQL query generator for Databricks. Generate only valid SQL queries without explanations."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    @classmethod
+    def _split_batch_sql(cls, content: str, count: int) -> List[Optional[str]]:
+        """Split a batched reply into per-question SQL by its numbered headers."""
+        sqls: List[Optional[str]] = [None] * count
+        parts = _BATCH_MARKER_RE.split(content)
+        # parts alternates [preamble, number, body, number, body, ...]
+        for number, body in zip(parts[1::2], parts[2::2]):
+            index = int(number) - 1
+            if 0 <= index < count and sqls[index] is None:
+                sql = cls._extract_sql(body)
+                sqls[index] = sql or None
+        return sqls
+    
+    @staticmethod
+    def _build_insights_messages(prompt: str) -> List[Dict[str, str]]:
+        """Build the chat messages for insights generation."""
+        return [
+            {
+                "role": "system",
+                "content": "You are a business intelligence analyst. Provide clear, actionable insights from data."
+            },
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ]
+    
+    @staticmethod
+    def _extract_sql(content: str) -> str:
+        """Extract SQL from the model reply, unwrapping markdown code blocks if present."""
+        match = _FENCE_RE.search(content)
+        return match.group(1).strip() if match else content.strip()
+    
+    # Prompt builders are pure functions of their string arguments, so repeated
+    # questions against the same schema reuse the already-built prompt
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def _build_intent_prompt(
+        user_query: str,
+        schema_info: str,
+        context: Optional[str]
+    ) -> str:
+        """Build prompt for query intent parsing."""
+        return f"""
+Analyze this user query and extract the intent:
+
+Query: {user_query}
+
+Available Schema:
+{schema_info}
+
+Context:
+{context if context else 'None'}
+
+Return a JSON object with:
+- table_name: which table to query
+- columns: list of columns needed (or null for all)
+- filters: dictionary of column: value filters
+- aggregations: dictionary of column: aggregation_function (COUNT, SUM, AVG, etc.)
+- group_by: list of columns to group by
+- order_by: list of [column, direction] pairs
+- limit: number of rows to return
+
+Return only valid JSON, no explanations.
+"""
+    
+    @staticmethod
+    @lru_cache(maxsize=64)
     def _build_sql_generation_prompt(
-        self,
         user_query: str,
         schema_info: str,
         context: Optional[str]
@@ -276,6 +551,40 @@ Rules:
 6. Return ONLY the SQL query, no explanations
 
 Generate the SQL query:
+"""
+        return prompt
+    
+    @staticmethod
+    def _build_batch_sql_prompt(
+        questions: List[Tuple[str, Optional[str]]],
+        schema_info: str
+    ) -> str:
+        """Build one prompt asking for SQL for each numbered question."""
+        prompt = f"""
+Generate a SQL query for Databricks SQL to answer each numbered question.
+
+Available Schema:
+{schema_info}
+
+Questions:
+"""
+        for number, (user_query, context) in enumerate(questions, 1):
+            prompt += f"{number}) {user_query}\n"
+            if context:
+                prompt += f"   Additional Context: {context}\n"
+        
+        prompt += """
+Rules:
+1. Use only columns that exist in the schema
+2. Wrap column names with spaces in backticks: `Column Name`
+3. Use proper aggregations (SUM, AVG, COUNT, etc.) when needed
+4. Include appropriate GROUP BY for aggregations
+5. Add ORDER BY for meaningful sorting
+6. Answer every question, in order, each starting on its own line with a
+   header of the form "-- Query N" where N is the question number
+7. Return ONLY the headers and SQL queries, no explanations
+
+Generate the SQL queries:
 """
         return prompt
     
@@ -343,7 +652,8 @@ Keep the insights concise and business-focused.
 def create_llm_service(
     api_key: Optional[str] = None,
     model: Optional[str] = None,
-    provider: str = "mistral"
+    provider: str = "mistral",
+    max_concurrent_requests: Optional[int] = None
 ) -> Optional[MistralLLMService]:
     """
     Factory function to create LLM service.
@@ -352,6 +662,8 @@ def create_llm_service(
         api_key: API key (will use env var if not provided)
         model: Model name (will use env var or default if not provided)
         provider: LLM provider (currently only 'mistral' supported)
+        max_concurrent_requests: Cap on concurrent requests (will use
+            env var or default if not provided)
         
     Returns:
         LLM service instance or None if not configured
@@ -366,9 +678,14 @@ def create_llm_service(
         return None
     
     model = model or os.getenv('MISTRAL_MODEL', 'mistral-large-latest')
+    max_concurrent_requests = max_concurrent_requests or int(os.getenv('MISTRAL_MAX_CONCURRENT_REQUESTS', '4'))
     
     try:
-        service = MistralLLMService(api_key=api_key, model=model)
+        service = MistralLLMService(
+            api_key=api_key,
+            model=model,
+            max_concurrent_requests=max_concurrent_requests
+        )
         return service
     except Exception as e:
         logger.error(f"Failed to create LLM service: {e}")
@@ -3,32 +3,351 @@ Schema auto-detection module for Databricks tables.
 Automatically loads table schemas from Databricks without manual definition.
 """
 
+import asyncio
+import copy
+import json
 import logging
-from typing import List, Optional, Dict
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, as_completed
+from operator import itemgetter
+from sys import intern
+from typing import Iterator, List, Optional, Dict, Tuple
 from .sql_generator import TableSchema, SchemaManager
 
+try:
+    from platformdirs import user_cache_dir
+except ImportError:
+    user_cache_dir = None
+
 logger = logging.getLogger(__name__)
 
+# Top-level field of the "Schema: root" tree in SHOW TABLE EXTENDED output,
+# e.g. " |-- amount: decimal(10,2) (nullable = true)"; nested struct fields
+# are indented further and don't match
+_EXTENDED_COLUMN_RE = re.compile(r"^ \|-- (.+?): (.+?) \(nullable = (?:true|false)\)$", re.MULTILINE)
+_EXTENDED_COMMENT_RE = re.compile(r"^Comment: (.*)$", re.MULTILINE)
+
+# Catalogs backed by the legacy Hive metastore, which has no INFORMATION_SCHEMA
+_LEGACY_CATALOGS = frozenset({"hive_metastore", "spark_catalog"})
+
+# Error text meaning the warehouse can't run a metadata query at all, as
+# opposed to a timeout or dropped connection worth retrying on a later load
+_UNSUPPORTED_ERROR_RE = re.compile(
+    r"PARSE_SYNTAX_ERROR|UNSUPPORTED|not supported|TABLE_OR_VIEW_NOT_FOUND|SCHEMA_NOT_FOUND",
+    re.IGNORECASE
+)
+
+
+def _sql_literal(value: str) -> str:
+    """Quote a value as a SQL string literal."""
+    return "'" + value.replace("'", "''") + "'"
+
+
+def default_schema_cache_path() -> str:
+    """Path of the on-disk schema cache in the user's cache directory."""
+    if user_cache_dir is not None:
+        cache_dir = user_cache_dir("databricks-insight-agent")
+    else:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "databricks-insight-agent")
+    return os.path.join(cache_dir, "schemas.sqlite3")
+
+
+class _SchemaDiskCache:
+    """
+    SQLite store of table schemas that survives process restarts.
+    
+    Each row keeps the table's last-modified time (when known) so a stale
+    entry can be revalidated with DESCRIBE DETAIL instead of a full DESCRIBE.
+    """
+    
+    def __init__(self, path: str):
+        """
+        Open (or create) the cache database.
+        
+        Args:
+            path: SQLite file path
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS schemas ("
+                "catalog TEXT NOT NULL, schema TEXT NOT NULL, table_name TEXT NOT NULL, "
+                "mtime TEXT, json_blob TEXT NOT NULL, cached_at REAL NOT NULL, "
+                "PRIMARY KEY (catalog, schema, table_name))"
+            )
+    
+    def get(self, key: Tuple[str, str, str]) -> Optional[Tuple[TableSchema, Optional[str], float]]:
+        """Return (schema, mtime, cached_at) for a key, or None if absent."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime, json_blob, cached_at FROM schemas "
+                "WHERE catalog = ? AND schema = ? AND table_name = ?",
+                key
+            ).fetchone()
+        if row is None:
+            return None
+        
+        mtime, json_blob, cached_at = row
+        data = json.loads(json_blob)
+        table_schema = TableSchema(
+            name=key[2],
+            columns=data['columns'],
+            column_types=[intern(col_type) if col_type else None for col_type in data['types']],
+            description=data['description']
+        )
+        return table_schema, mtime, cached_at
+    
+    def put(self, key: Tuple[str, str, str], table_schema: TableSchema, mtime: Optional[str]):
+        """Store a schema with its last-modified time."""
+        json_blob = json.dumps({
+            'columns': table_schema.column_names,
+            'types': table_schema.column_type_names,
+            'description': table_schema.description
+        })
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO schemas VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, mtime, json_blob, time.time())
+            )
+    
+    def touch(self, key: Tuple[str, str, str]):
+        """Mark an entry as revalidated now."""
+        with self._lock, self._conn:
+            self._conn.execute(
+                "UPDATE schemas SET cached_at = ? WHERE catalog = ? AND schema = ? AND table_name = ?",
+                (time.time(), *key)
+            )
+    
+    def invalidate(
+        self,
+        table_name: Optional[str] = None,
+        catalog: Optional[str] = None,
+        schema: Optional[str] = None
+    ):
+        """Delete entries matching every given field (all entries if none)."""
+        clauses = []
+        params = []
+        for column, value in (('catalog', catalog), ('schema', schema), ('table_name', table_name)):
+            if value is not None:
+                clauses.append(f"{column} = ?")
+                params.append(value)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock, self._conn:
+            self._conn.execute(f"DELETE FROM schemas{where}", params)
+
 
 class SchemaLoader:
     """
     Automatically loads table schemas from Databricks.
     """
     
-    def __init__(self, databricks_client):
+    def __init__(
+        self,
+        databricks_client,
+        cache_ttl_seconds: float = 300,
+        negative_cache_ttl_seconds: float = 30,
+        cache_size: int = 1024,
+        disk_cache_path: Optional[str] = None,
+        disk_cache_ttl_seconds: float = 86400
+    ):
         """
         Initialize schema loader.
         
         Args:
             databricks_client: DatabricksClient instance
+            cache_ttl_seconds: How long a loaded table schema is reused (0 disables caching)
+            negative_cache_ttl_seconds: How long a missing or failing table is remembered
+            cache_size: Maximum number of cached tables
+            disk_cache_path: SQLite file that keeps described tables across
+                restarts (None disables; see default_schema_cache_path)
+            disk_cache_ttl_seconds: How long a disk entry is trusted before
+                it is revalidated against the table's last-modified time
         """
         self.databricks_client = databricks_client
+        self.cache_ttl_seconds = cache_ttl_seconds
+        self.negative_cache_ttl_seconds = negative_cache_ttl_seconds
+        self.cache_size = cache_size
+        # (catalog, schema, table) -> (TableSchema or None, expiry time), in LRU order
+        self._cache: "OrderedDict[Tuple[str, str, str], Tuple[Optional[TableSchema], float]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        # Whether SHOW TABLE EXTENDED output is usable; None until first tried
+        self._show_extended_supported: Optional[bool] = None
+        # Unity Catalog catalogs whose INFORMATION_SCHEMA turned out to be missing
+        self._catalogs_without_information_schema = set()
+        self.disk_cache_ttl_seconds = disk_cache_ttl_seconds
+        self._disk_cache: Optional[_SchemaDiskCache] = None
+        if disk_cache_path:
+            try:
+                self._disk_cache = _SchemaDiskCache(disk_cache_path)
+            except (OSError, sqlite3.Error) as e:
+                logger.warning(f"Schema disk cache unavailable at {disk_cache_path}: {e}")
+    
+    def invalidate(
+        self,
+        table_name: Optional[str] = None,
+        catalog: Optional[str] = None,
+        schema: Optional[str] = None
+    ):
+        """
+        Drop cached schemas so the next load queries Databricks again.
+        
+        Clears matching entries from both the in-memory and the disk cache.
+        
+        Args:
+            table_name: Table to drop (None = all tables)
+            catalog: Only drop entries in this catalog (None = any)
+            schema: Only drop entries in this schema (None = any)
+        """
+        if self._disk_cache is not None:
+            try:
+                self._disk_cache.invalidate(table_name, catalog, schema)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not clear schema disk cache: {e}")
+        
+        with self._cache_lock:
+            if table_name is None and catalog is None and schema is None:
+                self._cache.clear()
+                return
+            for key in [
+                key for key in self._cache
+                if (catalog is None or key[0] == catalog)
+                and (schema is None or key[1] == schema)
+                and (table_name is None or key[2] == table_name)
+            ]:
+                del self._cache[key]
+    
+    def _cache_get(self, key: Tuple[str, str, str]):
+        """Return (hit, schema) for a cache key, evicting it if expired."""
+        with self._cache_lock:
+            entry = self._cache.get(key)
+            if entry is None:
+                return False, None
+            table_schema, expires_at = entry
+            if time.monotonic() >= expires_at:
+                del self._cache[key]
+                return False, None
+            self._cache.move_to_end(key)
+            return True, table_schema
+    
+    def _cache_put(self, key: Tuple[str, str, str], table_schema: Optional[TableSchema]):
+        """Cache a load result; None results use the shorter negative TTL."""
+        ttl = self.cache_ttl_seconds if table_schema is not None else self.negative_cache_ttl_seconds
+        if ttl <= 0 or self.cache_ttl_seconds <= 0:
+            return
+        with self._cache_lock:
+            self._cache[key] = (table_schema, time.monotonic() + ttl)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
     
     def load_table_schema(
         self, 
         table_name: str,
         catalog: str = "hive_metastore",
         schema: str = "default"
+    ) -> Optional[TableSchema]:
+        """
+        Load schema for a specific table, reusing recently loaded results.
+        
+        Args:
+            table_name: Name of the table
+            catalog: Catalog name (default: hive_metastore)
+            schema: Schema/database name (default: default)
+            
+        Returns:
+            TableSchema object or None if table doesn't exist
+        """
+        key = (catalog, schema, table_name)
+        hit, table_schema = self._cache_get(key)
+        if hit:
+            logger.debug(f"Using cached schema for table: {catalog}.{schema}.{table_name}")
+            return table_schema
+        
+        table_schema = self._load_uncached(table_name, catalog, schema)
+        self._cache_put(key, table_schema)
+        return table_schema
+    
+    def _load_uncached(
+        self,
+        table_name: str,
+        catalog: str,
+        schema: str
+    ) -> Optional[TableSchema]:
+        """
+        Load a table schema from the disk cache, or describe it and store it.
+        
+        Args:
+            table_name: Name of the table
+            catalog: Catalog name
+            schema: Schema/database name
+            
+        Returns:
+            TableSchema object or None if table doesn't exist
+        """
+        if self._disk_cache is None:
+            return self._describe_table(table_name, catalog, schema)
+        
+        key = (catalog, schema, table_name)
+        try:
+            entry = self._disk_cache.get(key)
+        except (sqlite3.Error, ValueError, KeyError) as e:
+            logger.warning(f"Ignoring unreadable disk cache entry for {catalog}.{schema}.{table_name}: {e}")
+            entry = None
+        
+        current_mtime = None
+        if entry is not None:
+            table_schema, mtime, cached_at = entry
+            if time.time() - cached_at < self.disk_cache_ttl_seconds:
+                logger.debug(f"Using disk-cached schema for table: {catalog}.{schema}.{table_name}")
+                return table_schema
+            
+            # Past the TTL the entry still holds if the table hasn't changed
+            if mtime is not None:
+                current_mtime = self._table_mtime(table_name, catalog, schema)
+            if current_mtime is not None and current_mtime == mtime:
+                logger.debug(f"Revalidated disk-cached schema for table: {catalog}.{schema}.{table_name}")
+                try:
+                    self._disk_cache.touch(key)
+                except sqlite3.Error as e:
+                    logger.debug(f"Could not refresh disk cache entry: {e}")
+                return table_schema
+        
+        table_schema = self._describe_table(table_name, catalog, schema)
+        if table_schema is not None:
+            try:
+                if current_mtime is None:
+                    current_mtime = self._table_mtime(table_name, catalog, schema)
+                self._disk_cache.put(key, table_schema, current_mtime)
+            except sqlite3.Error as e:
+                logger.warning(f"Could not write schema disk cache: {e}")
+        return table_schema
+    
+    def _table_mtime(self, table_name: str, catalog: str, schema: str) -> Optional[str]:
+        """Return the table's last-modified time from DESCRIBE DETAIL, if any."""
+        try:
+            rows = self.databricks_client.execute_query(
+                f"DESCRIBE DETAIL {catalog}.{schema}.{table_name}"
+            )
+        except Exception as e:
+            # Non-Delta tables and views don't support DESCRIBE DETAIL
+            logger.debug(f"Could not read last-modified time for {table_name}: {e}")
+            return None
+        
+        last_modified = rows[0].get('lastModified') if rows else None
+        return str(last_modified) if last_modified is not None else None
+    
+    def _describe_table(
+        self,
+        table_name: str,
+        catalog: str,
+        schema: str
     ) -> Optional[TableSchema]:
         """
         Load schema for a specific table from Databricks.
@@ -54,24 +373,30 @@ class SchemaLoader:
                 logger.warning(f"No schema information found for table: {full_table_name}")
                 return None
             
-            columns = []
             column_types = {}
             
-            # Parse DESCRIBE TABLE results
+            # Parse DESCRIBE TABLE results. Partition columns are listed
+            # again after '# Partition Information' and collapse onto their
+            # first entry, so the dict's keys and values become the
+            # TableSchema's parallel name/type tuples.
             for row in result:
+                col_name = row.get('col_name') or ''
+                
                 # Skip partition information and metadata rows
-                if row.get('col_name', '').startswith('#') or row.get('col_name', '') == '':
+                if not col_name or col_name[0] == '#':
                     continue
-                    
-                col_name = row.get('col_name', '').strip()
-                col_type = row.get('data_type', 'STRING').strip().upper()
                 
-                # Skip empty rows and comment rows
-                if not col_name or col_name.lower() in ['', 'col_name']:
+                col_name = col_name.strip()
+                
+                # Skip empty rows and header rows
+                if not col_name or col_name.lower() == 'col_name':
                     continue
                 
-                columns.append(col_name)
-                column_types[col_name] = col_type
+                # Types come from a small vocabulary; interning stores each
+                # distinct spelling once however many columns use it
+                column_types[col_name] = intern((row.get('data_type') or 'STRING').strip().upper())
+            
+            columns = tuple(column_types)
             
             if not columns:
                 logger.warning(f"No columns found for table: {full_table_name}")
@@ -93,7 +418,7 @@ class SchemaLoader:
             table_schema = TableSchema(
                 name=table_name,
                 columns=columns,
-                column_types=column_types,
+                column_types=tuple(column_types.values()),
                 description=description or f"Auto-detected schema for {table_name}"
             )
             
@@ -108,47 +433,344 @@ class SchemaLoader:
         self,
         catalog: str = "hive_metastore",
         schema: str = "default",
-        table_filter: Optional[List[str]] = None
+        table_filter: Optional[List[str]] = None,
+        max_concurrency: int = 8
     ) -> List[TableSchema]:
         """
         Load schemas for all tables in a schema/database.
         
+        A single SHOW TABLE EXTENDED is tried first. If the workspace
+        rejects it, tables are described concurrently instead, since each
+        DESCRIBE is a network round-trip to the warehouse; an "unsupported"
+        error is remembered for later calls.
+        
         Args:
             catalog: Catalog name
             schema: Schema/database name
             table_filter: Optional list of specific table names to load
+            max_concurrency: Maximum tables described at once (1 = sequential)
             
         Returns:
-            List of TableSchema objects
+            List of TableSchema objects, in SHOW TABLES order
         """
-        try:
-            # Get list of all tables
-            show_tables_query = f"SHOW TABLES IN {catalog}.{schema}"
-            logger.info(f"Discovering tables in {catalog}.{schema}")
-            
-            tables_result = self.databricks_client.execute_query(show_tables_query)
+        loaded = sorted(
+            self._iter_loaded_tables(catalog, schema, table_filter, max_concurrency),
+            key=itemgetter(0)
+        )
+        return [table_schema for _, table_schema in loaded]
+    
+    def iter_all_tables(
+        self,
+        catalog: str = "hive_metastore",
+        schema: str = "default",
+        table_filter: Optional[List[str]] = None,
+        max_concurrency: int = 8
+    ) -> Iterator[TableSchema]:
+        """
+        Yield table schemas as soon as each one finishes loading.
+        
+        Same loading strategy as load_all_tables, but per-table results
+        arrive in completion order rather than SHOW TABLES order.
+        
+        Args:
+            catalog: Catalog name
+            schema: Schema/database name
+            table_filter: Optional list of specific table names to load
+            max_concurrency: Maximum tables described at once (1 = sequential)
             
-            if not tables_result:
-                logger.warning(f"No tables found in {catalog}.{schema}")
-                return []
+        Yields:
+            TableSchema objects
+        """
+        for _, table_schema in self._iter_loaded_tables(catalog, schema, table_filter, max_concurrency):
+            yield table_schema
+    
+    def _iter_loaded_tables(
+        self,
+        catalog: str,
+        schema: str,
+        table_filter: Optional[List[str]],
+        max_concurrency: int
+    ) -> Iterator[Tuple[int, TableSchema]]:
+        """Yield (SHOW TABLES position, schema) pairs in completion order."""
+        if self._show_extended_supported is not False:
+            table_schemas = self._load_via_show_table_extended(catalog, schema, table_filter)
+            if table_schemas is not None:
+                logger.info(f"✅ Loaded {len(table_schemas)} table schemas from {catalog}.{schema}")
+                yield from enumerate(table_schemas)
+                return
+        
+        table_names = self._iter_table_names(catalog, schema, table_filter)
+        count = 0
+        
+        if max_concurrency > 1:
+            # The client's long-lived pool is sized to its connection pool,
+            # so describes never need more connections than it keeps open
+            executor = self._client_executor()
+            owns_executor = executor is None
+            if owns_executor:
+                executor = ThreadPoolExecutor(max_workers=max_concurrency)
+            in_flight = threading.BoundedSemaphore(max_concurrency)
             
-            table_schemas = []
+            def load(table_name: str) -> Optional[TableSchema]:
+                try:
+                    return self.load_table_schema(table_name, catalog, schema)
+                finally:
+                    in_flight.release()
             
-            for row in tables_result:
-                table_name = row.get('tableName') or row.get('name')
-                
-                if not table_name:
-                    continue
-                
-                # Apply filter if specified
-                if table_filter and table_name not in table_filter:
-                    continue
+            try:
+                # Submit each DESCRIBE as soon as its SHOW TABLES row arrives,
+                # overlapping the listing with the first describes
+                futures = {}
+                try:
+                    for position, table_name in enumerate(table_names):
+                        in_flight.acquire()
+                        futures[executor.submit(load, table_name)] = position
+                except Exception as e:
+                    logger.error(f"Failed to load tables from {catalog}.{schema}: {e}")
                 
-                # Load schema for this table
+                for future in as_completed(futures):
+                    table_schema = future.result()
+                    if table_schema:
+                        count += 1
+                        yield futures[future], table_schema
+            finally:
+                if owns_executor:
+                    executor.shutdown()
+        else:
+            try:
+                for position, table_name in enumerate(table_names):
+                    table_schema = self.load_table_schema(table_name, catalog, schema)
+                    if table_schema:
+                        count += 1
+                        yield position, table_schema
+            except Exception as e:
+                logger.error(f"Failed to load tables from {catalog}.{schema}: {e}")
+        
+        logger.info(f"✅ Loaded {count} table schemas from {catalog}.{schema}")
+    
+    def _client_executor(self) -> Optional[Executor]:
+        """Return the client's long-lived executor, or None if it has none."""
+        shared_executor = getattr(self.databricks_client, 'executor', None)
+        executor = shared_executor() if callable(shared_executor) else None
+        return executor if isinstance(executor, Executor) else None
+    
+    def _load_via_show_table_extended(
+        self,
+        catalog: str,
+        schema: str,
+        table_filter: Optional[List[str]] = None
+    ) -> Optional[List[TableSchema]]:
+        """
+        Load every table's columns and comment with one SHOW TABLE EXTENDED.
+        
+        Args:
+            catalog: Catalog name
+            schema: Schema/database name
+            table_filter: Optional list of specific table names to load
+            
+        Only an error saying the command is unsupported turns this path off
+        for later calls; other failures fall back for this call alone. Rows
+        whose output can't be parsed are described individually instead.
+        
+        Returns:
+            List of TableSchema objects in result order, or None if the
+            command failed
+        """
+        try:
+            logger.info(f"Loading table metadata with SHOW TABLE EXTENDED in {catalog}.{schema}")
+            rows = self.databricks_client.execute_query(
+                f"SHOW TABLE EXTENDED IN {catalog}.{schema} LIKE '*'"
+            )
+        except Exception as e:
+            if _UNSUPPORTED_ERROR_RE.search(str(e)):
+                self._show_extended_supported = False
+            logger.info(f"SHOW TABLE EXTENDED unavailable, describing tables individually: {e}")
+            return None
+        
+        self._show_extended_supported = True
+        table_schemas = []
+        unparsed = []
+        for row in rows or []:
+            table_name = row.get('tableName')
+            if not table_name or (table_filter and table_name not in table_filter):
+                continue
+            
+            information = row.get('information') or ''
+            column_types = {
+                col_name: intern(col_type.upper())
+                for col_name, col_type in _EXTENDED_COLUMN_RE.findall(information)
+            }
+            if not column_types:
+                unparsed.append(table_name)
+                continue
+            
+            comment_match = _EXTENDED_COMMENT_RE.search(information)
+            table_schema = TableSchema(
+                name=table_name,
+                columns=tuple(column_types),
+                column_types=tuple(column_types.values()),
+                description=(comment_match.group(1).strip() if comment_match else None)
+                or f"Auto-detected schema for {table_name}"
+            )
+            table_schemas.append(table_schema)
+        
+        for table_schema in table_schemas:
+            self._cache_put((catalog, schema, table_schema.name), table_schema)
+        
+        if unparsed:
+            logger.info(f"Unrecognized SHOW TABLE EXTENDED output for {len(unparsed)} tables, describing them individually")
+            for table_name in unparsed:
                 table_schema = self.load_table_schema(table_name, catalog, schema)
-                
                 if table_schema:
                     table_schemas.append(table_schema)
+        
+        return table_schemas
+    
+    def _list_tables(
+        self,
+        catalog: str,
+        schema: str,
+        table_filter: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        List table names in a schema with SHOW TABLES.
+        
+        Args:
+            catalog: Catalog name
+            schema: Schema/database name
+            table_filter: Optional list of specific table names to keep
+            
+        Returns:
+            Table names in SHOW TABLES order
+        """
+        return list(self._iter_table_names(catalog, schema, table_filter))
+    
+    def _iter_table_names(
+        self,
+        catalog: str,
+        schema: str,
+        table_filter: Optional[List[str]] = None
+    ) -> Iterator[str]:
+        """
+        Yield table names from SHOW TABLES as result batches arrive.
+        
+        Clients with iter_query stream the result, so callers can start
+        describing the first tables before the listing completes; others
+        fall back to execute_query.
+        
+        Args:
+            catalog: Catalog name
+            schema: Schema/database name
+            table_filter: Optional list of specific table names to keep
+            
+        Yields:
+            Table names in SHOW TABLES order
+        """
+        # Get list of all tables
+        show_tables_query = f"SHOW TABLES IN {catalog}.{schema}"
+        logger.info(f"Discovering tables in {catalog}.{schema}")
+        
+        iter_query = getattr(self.databricks_client, 'iter_query', None)
+        if iter_query is not None:
+            tables_result = iter_query(show_tables_query)
+        else:
+            tables_result = self.databricks_client.execute_query(show_tables_query) or []
+        
+        found = False
+        for row in tables_result:
+            found = True
+            table_name = row.get('tableName') or row.get('name')
+            
+            if not table_name:
+                continue
+            
+            # Apply filter if specified
+            if table_filter and table_name not in table_filter:
+                continue
+            
+            yield table_name
+        
+        if not found:
+            logger.warning(f"No tables found in {catalog}.{schema}")
+    
+    async def aload_table_schema(
+        self,
+        table_name: str,
+        catalog: str = "hive_metastore",
+        schema: str = "default"
+    ) -> Optional[TableSchema]:
+        """
+        Async version of load_table_schema.
+        
+        The Databricks SQL connector is blocking, so the DESCRIBE runs on
+        the client's executor (the event loop's default executor for
+        clients without one); cache hits return without a thread hop.
+        
+        Args:
+            table_name: Name of the table
+            catalog: Catalog name (default: hive_metastore)
+            schema: Schema/database name (default: default)
+            
+        Returns:
+            TableSchema object or None if table doesn't exist
+        """
+        key = (catalog, schema, table_name)
+        hit, table_schema = self._cache_get(key)
+        if hit:
+            logger.debug(f"Using cached schema for table: {catalog}.{schema}.{table_name}")
+            return table_schema
+        
+        table_schema = await asyncio.get_running_loop().run_in_executor(
+            self._client_executor(), self._load_uncached, table_name, catalog, schema
+        )
+        self._cache_put(key, table_schema)
+        return table_schema
+    
+    async def aload_all_tables(
+        self,
+        catalog: str = "hive_metastore",
+        schema: str = "default",
+        table_filter: Optional[List[str]] = None,
+        max_concurrency: int = 16
+    ) -> List[TableSchema]:
+        """
+        Async version of load_all_tables_bulk for callers already in an
+        event loop.
+        
+        The INFORMATION_SCHEMA and SHOW TABLE EXTENDED bulk queries are
+        tried first; tables are only described one by one when neither is
+        usable. Blocking queries run on the client's executor.
+        
+        Args:
+            catalog: Catalog name
+            schema: Schema/database name
+            table_filter: Optional list of specific table names to load
+            max_concurrency: Maximum tables described at once
+            
+        Returns:
+            List of TableSchema objects, in the order the bulk query or
+            SHOW TABLES returned them
+        """
+        loop = asyncio.get_running_loop()
+        executor = self._client_executor()
+        try:
+            table_schemas = await loop.run_in_executor(executor, self._load_bulk, catalog, schema, table_filter)
+            if table_schemas is not None:
+                logger.info(f"✅ Loaded {len(table_schemas)} table schemas from {catalog}.{schema}")
+                return table_schemas
+            
+            table_names = await loop.run_in_executor(executor, self._list_tables, catalog, schema, table_filter)
+            
+            semaphore = asyncio.Semaphore(max(1, max_concurrency))
+            
+            async def load(table_name: str) -> Optional[TableSchema]:
+                async with semaphore:
+                    return await self.aload_table_schema(table_name, catalog, schema)
+            
+            # gather() keeps SHOW TABLES order
+            loaded = await asyncio.gather(*(load(table_name) for table_name in table_names))
+            
+            table_schemas = [table_schema for table_schema in loaded if table_schema]
             
             logger.info(f"✅ Loaded {len(table_schemas)} table schemas from {catalog}.{schema}")
             return table_schemas
@@ -157,6 +779,120 @@ class SchemaLoader:
             logger.error(f"Failed to load tables from {catalog}.{schema}: {e}")
             return []
     
+    def load_all_tables_bulk(
+        self,
+        catalog: str = "hive_metastore",
+        schema: str = "default",
+        table_filter: Optional[List[str]] = None
+    ) -> List[TableSchema]:
+        """
+        Load schemas for all tables with two INFORMATION_SCHEMA queries.
+        
+        One query returns every column of every table and a second returns
+        the table comments, instead of a DESCRIBE and SHOW TBLPROPERTIES per
+        table. Legacy Hive metastore catalogs (hive_metastore,
+        spark_catalog) have no INFORMATION_SCHEMA and go straight to
+        load_all_tables, as does any catalog whose INFORMATION_SCHEMA
+        was found missing on an earlier call.
+        
+        Args:
+            catalog: Catalog name
+            schema: Schema/database name
+            table_filter: Optional list of specific table names to load
+            
+        Returns:
+            List of TableSchema objects, ordered by table name
+        """
+        table_schemas = self._load_via_information_schema(catalog, schema, table_filter)
+        if table_schemas is None:
+            return self.load_all_tables(catalog, schema, table_filter)
+        return table_schemas
+    
+    def _load_bulk(
+        self,
+        catalog: str,
+        schema: str,
+        table_filter: Optional[List[str]] = None
+    ) -> Optional[List[TableSchema]]:
+        """Try INFORMATION_SCHEMA, then SHOW TABLE EXTENDED; None if neither is usable."""
+        table_schemas = self._load_via_information_schema(catalog, schema, table_filter)
+        if table_schemas is None and self._show_extended_supported is not False:
+            table_schemas = self._load_via_show_table_extended(catalog, schema, table_filter)
+        return table_schemas
+    
+    def _load_via_information_schema(
+        self,
+        catalog: str,
+        schema: str,
+        table_filter: Optional[List[str]] = None
+    ) -> Optional[List[TableSchema]]:
+        """
+        Run the INFORMATION_SCHEMA queries behind load_all_tables_bulk.
+        
+        Args:
+            catalog: Catalog name
+            schema: Schema/database name
+            table_filter: Optional list of specific table names to load
+            
+        Returns:
+            List of TableSchema objects, or None if the catalog has no
+            usable INFORMATION_SCHEMA
+        """
+        if catalog.lower() in _LEGACY_CATALOGS or catalog in self._catalogs_without_information_schema:
+            return None
+        
+        where = f"table_schema = {_sql_literal(schema)}"
+        if table_filter:
+            names = ", ".join(_sql_literal(name) for name in table_filter)
+            where += f" AND table_name IN ({names})"
+        
+        try:
+            logger.info(f"Loading column metadata from {catalog}.information_schema")
+            column_rows = self.databricks_client.execute_query(
+                f"SELECT table_name, column_name, full_data_type "
+                f"FROM {catalog}.information_schema.columns "
+                f"WHERE {where} ORDER BY table_name, ordinal_position"
+            )
+        except Exception as e:
+            if _UNSUPPORTED_ERROR_RE.search(str(e)):
+                self._catalogs_without_information_schema.add(catalog)
+            logger.info(f"INFORMATION_SCHEMA unavailable for {catalog}, describing tables individually: {e}")
+            return None
+        
+        if not column_rows:
+            return None
+        
+        # Group columns by table in a single pass (rows arrive sorted)
+        tables: Dict[str, Dict[str, str]] = {}
+        for row in column_rows:
+            column_types = tables.setdefault(row['table_name'], {})
+            column_types[row['column_name']] = intern((row.get('full_data_type') or 'STRING').upper())
+        
+        descriptions = {}
+        try:
+            comment_rows = self.databricks_client.execute_query(
+                f"SELECT table_name, comment FROM {catalog}.information_schema.tables WHERE {where}"
+            )
+            descriptions = {row['table_name']: row.get('comment') for row in comment_rows}
+        except Exception as e:
+            logger.debug(f"Could not retrieve table comments: {e}")
+        
+        table_schemas = [
+            TableSchema(
+                name=table_name,
+                columns=tuple(column_types),
+                column_types=tuple(column_types.values()),
+                description=descriptions.get(table_name) or f"Auto-detected schema for {table_name}"
+            )
+            for table_name, column_types in tables.items()
+        ]
+        
+        for table_schema in table_schemas:
+            self._cache_put((catalog, schema, table_schema.name), table_schema)
+        
+        logger.info(f"✅ Loaded {len(table_schemas)} table schemas from {catalog}.{schema}")
+        return table_schemas
+    
     def auto_populate_schema_manager(
         self,
         schema_manager: SchemaManager,
@@ -167,6 +903,14 @@ class SchemaLoader:
         """
         Automatically populate a SchemaManager with all tables from Databricks.
         
+        Unity Catalog catalogs are read from INFORMATION_SCHEMA; legacy
+        Hive metastore catalogs skip straight to SHOW TABLE EXTENDED and,
+        failing that, per-table DESCRIBE (see load_all_tables).
+        
+        When tables have to be described one by one, each is registered as
+        soon as it loads, so the manager is usable before the slowest table
+        finishes.
+        
         Args:
             schema_manager: SchemaManager instance to populate
             catalog: Catalog name
@@ -176,7 +920,9 @@ class SchemaLoader:
         Returns:
             Number of tables successfully loaded
         """
-        table_schemas = self.load_all_tables(catalog, schema, table_filter)
+        table_schemas = self._load_via_information_schema(catalog, schema, table_filter)
+        if table_schemas is None:
+            table_schemas = self.iter_all_tables(catalog, schema, table_filter)
         
         count = 0
         for table_schema in table_schemas:
@@ -192,7 +938,8 @@ def create_schema_manager_from_databricks(
     catalog: str = "hive_metastore",
     schema: str = "default",
     specific_tables: Optional[List[str]] = None,
-    fallback_to_sample: bool = True
+    fallback_to_sample: bool = True,
+    persistent_cache: bool = False
 ) -> SchemaManager:
     """
     Create and populate a SchemaManager from Databricks.
@@ -203,6 +950,11 @@ def create_schema_manager_from_databricks(
         schema: Schema/database name
         specific_tables: Optional list of specific table names to load
         fallback_to_sample: If True, use sample schema if Databricks connection fails
+        persistent_cache: If True, keep individually described tables in
+            the user cache directory so restarts skip unchanged ones. Off by
+            default: it writes outside the project, costs a DESCRIBE DETAIL
+            per cache miss, and only applies when neither INFORMATION_SCHEMA
+            nor SHOW TABLE EXTENDED can be used
         
     Returns:
         Populated SchemaManager instance
@@ -217,7 +969,10 @@ def create_schema_manager_from_databricks(
         return schema_manager
     
     try:
-        loader = SchemaLoader(databricks_client)
+        loader = SchemaLoader(
+            databricks_client,
+            disk_cache_path=default_schema_cache_path() if persistent_cache else None
+        )
         count = loader.auto_populate_schema_manager(
             schema_manager,
             catalog=catalog,
@@ -238,54 +993,56 @@ def create_schema_manager_from_databricks(
     return schema_manager
 
 
+# Sample table schemas for demonstration, built once at import
+_SAMPLE_SALES = TableSchema(
+    name="sales",
+    columns=["transaction_id", "customer_id", "product_id", "amount", "date", "region"],
+    column_types={
+        "transaction_id": "STRING",
+        "customer_id": "STRING",
+        "product_id": "STRING",
+        "amount": "DECIMAL",
+        "date": "DATE",
+        "region": "STRING"
+    },
+    description="Sample sales transaction data"
+)
+
+_SAMPLE_CUSTOMERS = TableSchema(
+    name="customers",
+    columns=["customer_id", "name", "email", "registration_date", "country"],
+    column_types={
+        "customer_id": "STRING",
+        "name": "STRING",
+        "email": "STRING",
+        "registration_date": "DATE",
+        "country": "STRING"
+    },
+    description="Sample customer information"
+)
+
+_SAMPLE_PRODUCTS = TableSchema(
+    name="products",
+    columns=["product_id", "name", "category", "price", "stock_quantity"],
+    column_types={
+        "product_id": "STRING",
+        "name": "STRING",
+        "category": "STRING",
+        "price": "DECIMAL",
+        "stock_quantity": "INT"
+    },
+    description="Sample product catalog"
+)
+
+_SAMPLE_TABLES = (_SAMPLE_SALES, _SAMPLE_CUSTOMERS, _SAMPLE_PRODUCTS)
+
+
 def _add_sample_schemas(schema_manager: SchemaManager):
     """Add sample table schemas for demonstration."""
     
-    # Sample sales table
-    sales_table = TableSchema(
-        name="sales",
-        columns=["transaction_id", "customer_id", "product_id", "amount", "date", "region"],
-        column_types={
-            "transaction_id": "STRING",
-            "customer_id": "STRING",
-            "product_id": "STRING",
-            "amount": "DECIMAL",
-            "date": "DATE",
-            "region": "STRING"
-        },
-        description="Sample sales transaction data"
-    )
-    
-    # Sample customers table
-    customers_table = TableSchema(
-        name="customers",
-        columns=["customer_id", "name", "email", "registration_date", "country"],
-        column_types={
-            "customer_id": "STRING",
-            "name": "STRING",
-            "email": "STRING",
-            "registration_date": "DATE",
-            "country": "STRING"
-        },
-        description="Sample customer information"
-    )
-    
-    # Sample products table
-    products_table = TableSchema(
-        name="products",
-        columns=["product_id", "name", "category", "price", "stock_quantity"],
-        column_types={
-            "product_id": "STRING",
-            "name": "STRING",
-            "category": "STRING",
-            "price": "DECIMAL",
-            "stock_quantity": "INT"
-        },
-        description="Sample product catalog"
-    )
-    
-    schema_manager.add_table(sales_table)
-    schema_manager.add_table(customers_table)
-    schema_manager.add_table(products_table)
-    
-    logger.info("✅ Added 3 sample table schemas")
+    # Shallow copies share the immutable column tuples but keep one
+    # manager's attribute changes from reaching another
+    for sample_table in _SAMPLE_TABLES:
+        schema_manager.add_table(copy.copy(sample_table))
+    
+    logger.info(f"✅ Added {len(_SAMPLE_TABLES)} sample table schemas")
@@ -5,11 +5,158 @@ Intelligently fixes SQL errors and retries queries with corrections.
 
 import logging
 import re
-from typing import Optional, Dict, List, Tuple
+import threading
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Optional, Dict, List, Sequence, Tuple
 from dataclasses import dataclass
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+try:
+    import sqlglot
+    from sqlglot import exp as sqlglot_exp
+except ImportError:
+    sqlglot = None
+    sqlglot_exp = None
+
+try:
+    from rapidfuzz import process as rapidfuzz_process
+    from rapidfuzz.distance import Levenshtein as rapidfuzz_levenshtein
+except ImportError:
+    rapidfuzz_process = None
+    rapidfuzz_levenshtein = None
 
 logger = logging.getLogger(__name__)
 
+# Patterns used by the SQLCorrector strategies, compiled once at import
+_ERROR_COLUMN_RE = re.compile(r"column[,\s]+'?`?(\w+)`?'?", re.IGNORECASE)
+_ERROR_TABLE_RE = re.compile(r"table '?(\w+)'?", re.IGNORECASE)
+_FROM_TABLE_RE = re.compile(r"FROM\s+`?(\w+)`?", re.IGNORECASE)
+_SELECT_CLAUSE_RE = re.compile(r"SELECT\s+(.*?)\s+FROM", re.IGNORECASE | re.DOTALL)
+_GROUP_BY_CLAUSE_RE = re.compile(r'GROUP BY.*?(?=ORDER BY|LIMIT|$)', re.IGNORECASE)
+_ORDER_BY_RE = re.compile(r'ORDER BY', re.IGNORECASE)
+_LIMIT_RE = re.compile(r'LIMIT', re.IGNORECASE)
+
+
+def _levenshtein_distance(s1: str, s2: str, max_distance: Optional[int] = None) -> int:
+    """
+    Calculate Levenshtein distance between two strings.
+    
+    Args:
+        s1: First string
+        s2: Second string
+        max_distance: Stop early once the distance must exceed this
+            
+    Returns:
+        The distance; once it exceeds max_distance, any larger value
+    """
+    if len(s1) < len(s2):
+        s1, s2 = s2, s1
+    
+    # The length gap alone is a lower bound on the distance
+    if max_distance is not None and len(s1) - len(s2) > max_distance:
+        return max_distance + 1
+    
+    if len(s2) == 0:
+        return len(s1)
+    
+    previous_row = list(range(len(s2) + 1))
+    for i, c1 in enumerate(s1):
+        current = i + 1
+        current_row = [current]
+        above_left = previous_row[0]
+        for j, c2 in enumerate(s2):
+            above = previous_row[j + 1]
+            # Substitution, then deletion, then insertion
+            cost = above_left if c1 == c2 else above_left + 1
+            if above + 1 < cost:
+                cost = above + 1
+            if current + 1 < cost:
+                cost = current + 1
+            current_row.append(cost)
+            current = cost
+            above_left = above
+        
+        # Row minima never decrease, so the cutoff is already exceeded
+        if max_distance is not None and min(current_row) > max_distance:
+            return max_distance + 1
+        previous_row = current_row
+    
+    return previous_row[-1]
+
+
+if njit is not None:
+    @njit(cache=True, nogil=True)
+    def _levenshtein_batch(target, packed, offsets, max_distance):
+        """
+        Levenshtein distance from target to every packed candidate.
+        
+        Candidate k is packed[offsets[k]:offsets[k + 1]]; all strings are
+        uint32 code points. Same cutoffs as _levenshtein_distance: a
+        distance above max_distance is reported as max_distance + 1.
+        """
+        n = target.shape[0]
+        count = offsets.shape[0] - 1
+        distances = np.empty(count, dtype=np.int32)
+        previous = np.empty(n + 1, dtype=np.int32)
+        current = np.empty(n + 1, dtype=np.int32)
+        
+        for k in range(count):
+            start = offsets[k]
+            m = offsets[k + 1] - start
+            if abs(m - n) > max_distance:
+                distances[k] = max_distance + 1
+                continue
+            
+            for j in range(n + 1):
+                previous[j] = j
+            
+            exceeded = False
+            for i in range(m):
+                c = packed[start + i]
+                current[0] = i + 1
+                row_min = i + 1
+                for j in range(n):
+                    cost = previous[j] if target[j] == c else previous[j] + 1
+                    if previous[j + 1] + 1 < cost:
+                        cost = previous[j + 1] + 1
+                    if current[j] + 1 < cost:
+                        cost = current[j] + 1
+                    current[j + 1] = cost
+                    if cost < row_min:
+                        row_min = cost
+                if row_min > max_distance:
+                    exceeded = True
+                    break
+                previous, current = current, previous
+            
+            distances[k] = max_distance + 1 if exceeded else previous[n]
+        
+        return distances
+else:
+    _levenshtein_batch = None
+
+
+def _code_points(text: str) -> np.ndarray:
+    """A string's code points as a uint32 array (UTF-32 has no BOM in -le)."""
+    return np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32)
+
+
+# Common syntax fixes used when the query can't be parsed: (pattern, replacement)
+_SYNTAX_FIXES = [
+    # Missing comma between columns
+    (re.compile(r"(\w+)\s+(\w+)\s+FROM", re.IGNORECASE), r"\1, \2 FROM"),
+    # Double quotes instead of single quotes for strings
+    (re.compile(r'"([^"]+)"', re.IGNORECASE), r"'\1'"),
+]
+_AGGREGATE_NAMES = ('COUNT', 'SUM', 'AVG', 'MIN', 'MAX')
+_AGGREGATE_RE = re.compile(r"\b(?:COUNT|SUM|AVG|MIN|MAX)\s*\(", re.IGNORECASE)
+
 
 @dataclass
 class SQLError:
@@ -74,6 +221,26 @@ class SQLErrorAnalyzer:
         }
     }
     
+    # Every pattern fused into one alternation so a single scan classifies
+    # the message; alternative i is the named group p<i>, mapped back to
+    # its error type via _GROUP_ERROR_TYPES.
+    _PATTERN_SOURCES = [
+        (error_type, pattern)
+        for error_type, error_info in ERROR_PATTERNS.items()
+        for pattern in error_info['patterns']
+    ]
+    _GROUP_ERROR_TYPES = {
+        f'p{index}': error_type
+        for index, (error_type, _) in enumerate(_PATTERN_SOURCES)
+    }
+    _COMBINED_PATTERN = re.compile(
+        '|'.join(
+            f'(?P<p{index}>{pattern})'
+            for index, (_, pattern) in enumerate(_PATTERN_SOURCES)
+        ),
+        re.IGNORECASE
+    )
+    
     def analyze_error(self, error_message: str, sql_query: str) -> Optional[SQLError]:
         """
         Analyze a SQL error message.
@@ -85,14 +252,15 @@ class SQLErrorAnalyzer:
         Returns:
             SQLError object or None if can't analyze
         """
-        for error_type, error_info in self.ERROR_PATTERNS.items():
-            for pattern in error_info['patterns']:
-                if re.search(pattern, error_message, re.IGNORECASE):
-                    return SQLError(
-                        error_message=error_message,
-                        error_type=error_type,
-                        sql_query=sql_query
-                    )
+        match = self._COMBINED_PATTERN.search(error_message)
+        if match:
+            # The outer named group closes last, so lastgroup names the
+            # alternative that matched even when it has inner groups
+            return SQLError(
+                error_message=error_message,
+                error_type=self._GROUP_ERROR_TYPES[match.lastgroup],
+                sql_query=sql_query
+            )
         
         # Unknown error type
         return SQLError(
@@ -107,15 +275,20 @@ class SQLCorrector:
     Corrects SQL queries based on error analysis and schema knowledge.
     """
     
-    def __init__(self, schema_manager):
+    def __init__(self, schema_manager, cache_size: int = 1024):
         """
         Initialize SQL corrector.
         
         Args:
             schema_manager: SchemaManager instance for schema validation
+            cache_size: Maximum number of remembered corrections (0 disables)
         """
         self.schema_manager = schema_manager
         self.analyzer = SQLErrorAnalyzer()
+        self.cache_size = cache_size
+        # (schema_version, top_k, sql_query, error_message) -> corrections
+        self._cache: "OrderedDict[Tuple[int, int, str, str], Tuple[SQLCorrection, ...]]" = OrderedDict()
+        self._cache_lock = threading.Lock()
     
     def correct_query(
         self,
@@ -134,82 +307,157 @@ class SQLCorrector:
         Returns:
             SQLCorrection object or None if can't correct
         """
+        corrections = self.correct_query_candidates(sql_query, error_message, top_k=1)
+        return corrections[0] if corrections else None
+    
+    def correct_query_candidates(
+        self,
+        sql_query: str,
+        error_message: str,
+        top_k: int = 3
+    ) -> List[SQLCorrection]:
+        """
+        Propose up to top_k corrections for a failed SQL query.
+        
+        Column and table name errors yield one candidate per close schema
+        name; other error types yield at most one.
+        
+        Args:
+            sql_query: Original SQL query
+            error_message: Error message from execution
+            top_k: Maximum number of candidates to return
+            
+        Returns:
+            Distinct corrections, most confident first
+        """
+        # Failing queries recur (dashboard refreshes, replays); the schema
+        # version in the key drops stale entries once tables change
+        key = (self.schema_manager.schema_version, top_k, sql_query, error_message)
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return list(cached)
+        
+        corrections = self._build_corrections(sql_query, error_message, top_k)
+        
+        if self.cache_size > 0:
+            with self._cache_lock:
+                self._cache[key] = tuple(corrections)
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        
+        return corrections
+    
+    def _build_corrections(
+        self,
+        sql_query: str,
+        error_message: str,
+        top_k: int
+    ) -> List[SQLCorrection]:
+        """Analyze the error and run the matching correction strategy."""
         sql_error = self.analyzer.analyze_error(error_message, sql_query)
         if not sql_error:
-            return None
+            return []
         
         logger.info(f"Attempting to correct SQL error: {sql_error.error_type}")
         
-        # Route to appropriate correction method
-        correction_method = {
-            'column_not_found': self._correct_column_name,
-            'table_not_found': self._correct_table_name,
-            'syntax_error': self._correct_syntax,
-            'type_mismatch': self._correct_type_cast,
-            'aggregate_error': self._correct_group_by
-        }.get(sql_error.error_type)
-        
-        if correction_method:
-            return correction_method(sql_error)
-        
-        return None
+        if sql_error.error_type == 'column_not_found':
+            corrections = self._column_name_corrections(sql_error, top_k)
+        elif sql_error.error_type == 'table_not_found':
+            corrections = self._table_name_corrections(sql_error, top_k)
+        else:
+            # Route to appropriate correction method
+            correction_method = {
+                'syntax_error': self._correct_syntax,
+                'type_mismatch': self._correct_type_cast,
+                'aggregate_error': self._correct_group_by
+            }.get(sql_error.error_type)
+            correction = correction_method(sql_error) if correction_method else None
+            corrections = [correction] if correction else []
+        
+        # Different names can produce the same SQL (e.g. substring matches)
+        seen = set()
+        return [
+            correction for correction in corrections
+            if not (correction.corrected_sql in seen or seen.add(correction.corrected_sql))
+        ]
     
     def _correct_column_name(self, sql_error: SQLError) -> Optional[SQLCorrection]:
         """Correct column name errors by suggesting similar column names."""
+        corrections = self._column_name_corrections(sql_error, top_k=1)
+        return corrections[0] if corrections else None
+    
+    def _column_name_corrections(self, sql_error: SQLError, top_k: int) -> List[SQLCorrection]:
+        """Build one correction per similar column name, closest first."""
         
         # Extract the problematic column name
-        pattern = r"column[,\s]+'?`?(\w+)`?'?"
-        match = re.search(pattern, sql_error.error_message, re.IGNORECASE)
+        match = _ERROR_COLUMN_RE.search(sql_error.error_message)
         if not match:
-            return None
+            return []
         
         wrong_column = match.group(1)
         
         # Find the table being queried
-        table_pattern = r"FROM\s+`?(\w+)`?"
-        table_match = re.search(table_pattern, sql_error.sql_query, re.IGNORECASE)
+        table_match = _FROM_TABLE_RE.search(sql_error.sql_query)
         if not table_match:
-            return None
+            return []
         
         table_name = table_match.group(1)
         table_columns = self.schema_manager.get_table_columns(table_name)
         
         if not table_columns:
-            return None
-        
-        # Find the most similar column name
-        similar_column = self._find_similar_string(wrong_column, table_columns)
+            return []
+        
+        # Find the most similar column names
+        similar_columns = self._find_similar_strings(
+            wrong_column,
+            table_columns,
+            self.schema_manager.get_table_columns_lower(table_name),
+            limit=top_k
+        )
         
-        if similar_column:
+        corrections = []
+        for rank, similar_column in enumerate(similar_columns):
             # Quote the column name if it contains spaces or special characters
             quoted_column = f"`{similar_column}`" if ' ' in similar_column or '-' in similar_column else similar_column
             corrected_sql = sql_error.sql_query.replace(wrong_column, quoted_column)
             
-            return SQLCorrection(
+            corrections.append(SQLCorrection(
                 original_sql=sql_error.sql_query,
                 corrected_sql=corrected_sql,
                 correction_type='column_name',
-                confidence=0.8
-            )
+                confidence=0.8 - 0.1 * rank
+            ))
         
-        return None
+        return corrections
     
     def _correct_table_name(self, sql_error: SQLError) -> Optional[SQLCorrection]:
         """Correct table name errors by suggesting similar table names."""
+        corrections = self._table_name_corrections(sql_error, top_k=1)
+        return corrections[0] if corrections else None
+    
+    def _table_name_corrections(self, sql_error: SQLError, top_k: int) -> List[SQLCorrection]:
+        """Build one correction per similar table name, closest first."""
         
         # Extract the problematic table name
-        pattern = r"table '?(\w+)'?"
-        match = re.search(pattern, sql_error.error_message, re.IGNORECASE)
+        match = _ERROR_TABLE_RE.search(sql_error.error_message)
         if not match:
-            return None
+            return []
         
         wrong_table = match.group(1)
         available_tables = self.schema_manager.get_all_tables()
         
-        # Find the most similar table name
-        similar_table = self._find_similar_string(wrong_table, available_tables)
+        # Find the most similar table names
+        similar_tables = self._find_similar_strings(
+            wrong_table,
+            available_tables,
+            self.schema_manager.get_all_tables_lower(),
+            limit=top_k
+        )
         
-        if similar_table:
+        corrections = []
+        for rank, similar_table in enumerate(similar_tables):
             corrected_sql = re.sub(
                 rf"\b{wrong_table}\b",
                 similar_table,
@@ -217,33 +465,40 @@ class SQLCorrector:
                 flags=re.IGNORECASE
             )
             
-            return SQLCorrection(
+            corrections.append(SQLCorrection(
                 original_sql=sql_error.sql_query,
                 corrected_sql=corrected_sql,
                 correction_type='table_name',
-                confidence=0.8
-            )
+                confidence=0.8 - 0.1 * rank
+            ))
         
-        return None
+        return corrections
     
     def _correct_syntax(self, sql_error: SQLError) -> Optional[SQLCorrection]:
         """Attempt to fix common syntax errors."""
         
-        corrected_sql = sql_error.sql_query
+        if sqlglot is not None:
+            try:
+                tree = sqlglot.parse_one(sql_error.sql_query, read='databricks')
+            except sqlglot.errors.ParseError:
+                tree = None
+            
+            if tree is not None:
+                if not self._add_missing_group_by(tree):
+                    return None
+                
+                return SQLCorrection(
+                    original_sql=sql_error.sql_query,
+                    corrected_sql=tree.sql(dialect='databricks'),
+                    correction_type='syntax',
+                    confidence=0.6
+                )
         
-        # Common syntax fixes
-        fixes = [
-            # Missing comma between columns
-            (r"(\w+)\s+(\w+)\s+FROM", r"\1, \2 FROM"),
-            # Double quotes instead of single quotes for strings
-            (r'"([^"]+)"', r"'\1'"),
-            # Missing GROUP BY for aggregates
-            (r"(SELECT.*?\bCOUNT\b.*?FROM.*?)(?!.*GROUP BY)", r"\1 GROUP BY 1"),
-        ]
+        corrected_sql = sql_error.sql_query
         
-        for pattern, replacement in fixes:
-            if re.search(pattern, corrected_sql, re.IGNORECASE):
-                corrected_sql = re.sub(pattern, replacement, corrected_sql, flags=re.IGNORECASE)
+        for pattern, replacement in _SYNTAX_FIXES:
+            if pattern.search(corrected_sql):
+                corrected_sql = pattern.sub(replacement, corrected_sql)
                 
                 if corrected_sql != sql_error.sql_query:
                     return SQLCorrection(
@@ -253,8 +508,51 @@ class SQLCorrector:
                         confidence=0.6
                     )
         
+        # Missing GROUP BY for aggregates
+        if _AGGREGATE_RE.search(corrected_sql) and 'GROUP BY' not in corrected_sql.upper():
+            return self._correct_group_by(sql_error)
+        
         return None
     
+    @staticmethod
+    def _add_missing_group_by(tree) -> bool:
+        """
+        Group every SELECT that mixes aggregates and plain columns but has
+        no GROUP BY, including nested selects.
+        
+        Args:
+            tree: Parsed sqlglot expression, modified in place
+            
+        Returns:
+            True if any GROUP BY was added
+        """
+        changed = False
+        for select in tree.find_all(sqlglot_exp.Select):
+            if select.args.get('group'):
+                continue
+            
+            group_keys = []
+            has_aggregate = False
+            for projection in select.expressions:
+                # Aggregates belong to this SELECT unless they sit in a
+                # window or a subquery
+                if any(
+                    agg.find_ancestor(sqlglot_exp.Window, sqlglot_exp.Select) is select
+                    for agg in projection.find_all(sqlglot_exp.AggFunc)
+                ):
+                    has_aggregate = True
+                # Window functions and nested aggregates can't be group keys
+                elif projection.find(sqlglot_exp.Window, sqlglot_exp.AggFunc):
+                    continue
+                elif not isinstance(projection, sqlglot_exp.Star) and projection.find(sqlglot_exp.Column):
+                    group_keys.append(projection.unalias().copy())
+            
+            if has_aggregate and group_keys:
+                select.group_by(*group_keys, copy=False)
+                changed = True
+        
+        return changed
+    
     def _correct_type_cast(self, sql_error: SQLError) -> Optional[SQLCorrection]:
         """Add explicit type casts where needed."""
         
@@ -275,8 +573,7 @@ class SQLCorrector:
         """Fix GROUP BY clause issues."""
         
         # Extract SELECT columns that aren't aggregated
-        select_pattern = r"SELECT\s+(.*?)\s+FROM"
-        select_match = re.search(select_pattern, sql_error.sql_query, re.IGNORECASE | re.DOTALL)
+        select_match = _SELECT_CLAUSE_RE.search(sql_error.sql_query)
         
         if not select_match:
             return None
@@ -287,38 +584,24 @@ class SQLCorrector:
         # This is simplified - real implementation would parse SQL properly
         columns = [col.strip() for col in select_clause.split(',')]
         non_aggregate_cols = [
-            col for col in columns 
-            if not any(agg in col.upper() for agg in ['COUNT', 'SUM', 'AVG', 'MIN', 'MAX'])
+            col for col, col_upper in ((col, col.upper()) for col in columns)
+            if not any(agg in col_upper for agg in _AGGREGATE_NAMES)
         ]
         
         if non_aggregate_cols:
             # Add or update GROUP BY clause
             group_by_clause = f"GROUP BY {', '.join(non_aggregate_cols)}"
+            upper_sql = sql_error.sql_query.upper()
             
-            if 'GROUP BY' in sql_error.sql_query.upper():
+            if 'GROUP BY' in upper_sql:
                 # Replace existing GROUP BY
-                corrected_sql = re.sub(
-                    r'GROUP BY.*?(?=ORDER BY|LIMIT|$)',
-                    group_by_clause + ' ',
-                    sql_error.sql_query,
-                    flags=re.IGNORECASE
-                )
+                corrected_sql = _GROUP_BY_CLAUSE_RE.sub(group_by_clause + ' ', sql_error.sql_query)
             else:
                 # Add GROUP BY before ORDER BY or LIMIT
-                if 'ORDER BY' in sql_error.sql_query.upper():
-                    corrected_sql = re.sub(
-                        r'ORDER BY',
-                        f'{group_by_clause} ORDER BY',
-                        sql_error.sql_query,
-                        flags=re.IGNORECASE
-                    )
-                elif 'LIMIT' in sql_error.sql_query.upper():
-                    corrected_sql = re.sub(
-                        r'LIMIT',
-                        f'{group_by_clause} LIMIT',
-                        sql_error.sql_query,
-                        flags=re.IGNORECASE
-                    )
+                if 'ORDER BY' in upper_sql:
+                    corrected_sql = _ORDER_BY_RE.sub(f'{group_by_clause} ORDER BY', sql_error.sql_query)
+                elif 'LIMIT' in upper_sql:
+                    corrected_sql = _LIMIT_RE.sub(f'{group_by_clause} LIMIT', sql_error.sql_query)
                 else:
                     corrected_sql = sql_error.sql_query.rstrip() + ' ' + group_by_clause
             
@@ -332,51 +615,96 @@ class SQLCorrector:
         
         return None
     
-    def _find_similar_string(self, target: str, candidates: List[str]) -> Optional[str]:
+    def _find_similar_string(
+        self,
+        target: str,
+        candidates: List[str],
+        candidates_lower: Optional[Sequence[str]] = None
+    ) -> Optional[str]:
         """
         Find the most similar string from candidates.
-        Uses Levenshtein distance.
-        """
-        if not candidates:
-            return None
+        Uses Levenshtein distance (rapidfuzz or numba when installed).
         
-        def levenshtein_distance(s1: str, s2: str) -> int:
-            """Calculate Levenshtein distance between two strings."""
-            if len(s1) < len(s2):
-                return levenshtein_distance(s2, s1)
-            
-            if len(s2) == 0:
-                return len(s1)
-            
-            previous_row = range(len(s2) + 1)
-            for i, c1 in enumerate(s1):
-                current_row = [i + 1]
-                for j, c2 in enumerate(s2):
-                    insertions = previous_row[j + 1] + 1
-                    deletions = current_row[j] + 1
-                    substitutions = previous_row[j] + (c1 != c2)
-                    current_row.append(min(insertions, deletions, substitutions))
-                previous_row = current_row
+        Args:
+            target: String to match
+            candidates: Candidate strings in their original casing
+            candidates_lower: Lowercased candidates, index-parallel to
+                candidates; computed here when not supplied
             
-            return previous_row[-1]
+        Returns:
+            Closest candidate in its original casing, or None
+        """
+        if candidates and target in candidates:
+            return target
         
-        # Calculate distances
-        distances = [
-            (candidate, levenshtein_distance(target.lower(), candidate.lower()))
-            for candidate in candidates
-        ]
+        matches = self._find_similar_strings(target, candidates, candidates_lower, limit=1)
+        return matches[0] if matches else None
+    
+    def _find_similar_strings(
+        self,
+        target: str,
+        candidates: List[str],
+        candidates_lower: Optional[Sequence[str]] = None,
+        limit: int = 3
+    ) -> List[str]:
+        """
+        Find up to limit candidates within 50% edit distance of target.
         
-        # Sort by distance
-        distances.sort(key=lambda x: x[1])
+        Args:
+            target: String to match
+            candidates: Candidate strings in their original casing
+            candidates_lower: Lowercased candidates, index-parallel to
+                candidates; computed here when not supplied
+            limit: Maximum number of matches to return
+            
+        Returns:
+            Matching candidates in their original casing, closest first
+            (ties keep candidate order)
+        """
+        if not candidates:
+            return []
         
-        # Return closest match if distance is reasonable
-        best_match, distance = distances[0]
-        max_distance = len(target) // 2  # Allow up to 50% difference
+        if candidates_lower is None:
+            candidates_lower = [candidate.lower() for candidate in candidates]
         
-        if distance <= max_distance:
-            return best_match
+        target_lower = target.lower()
+        max_distance = len(target) // 2  # Allow up to 50% difference
         
-        return None
+        if rapidfuzz_process is not None:
+            # C++ DP with early exit once a candidate exceeds max_distance
+            results = rapidfuzz_process.extract(
+                target_lower,
+                candidates_lower,
+                scorer=rapidfuzz_levenshtein.distance,
+                score_cutoff=max_distance,
+                limit=limit
+            )
+            return [candidates[index] for _, _, index in results]
+        
+        if _levenshtein_batch is not None:
+            # One compiled call over every candidate packed end to end
+            offsets = np.zeros(len(candidates_lower) + 1, dtype=np.int64)
+            np.cumsum([len(candidate_lower) for candidate_lower in candidates_lower], out=offsets[1:])
+            distances = _levenshtein_batch(
+                _code_points(target_lower),
+                _code_points(''.join(candidates_lower)),
+                offsets,
+                max_distance
+            )
+            matches = np.flatnonzero(distances <= max_distance)
+            ranked = matches[np.argsort(distances[matches], kind='stable')]
+            return [candidates[index] for index in ranked[:limit]]
+        
+        # Calculate distances, keeping only reasonable matches
+        distances = []
+        for index, candidate_lower in enumerate(candidates_lower):
+            distance = _levenshtein_distance(target_lower, candidate_lower, max_distance)
+            if distance <= max_distance:
+                distances.append((distance, index))
+        
+        # Sort by distance; index breaks ties in candidate order
+        distances.sort()
+        return [candidates[index] for _, index in distances[:limit]]
 
 
 class RetryableQueryExecutor:
@@ -384,16 +712,22 @@ class RetryableQueryExecutor:
     Executes SQL queries with automatic error correction and retry logic.
     """
     
-    def __init__(self, databricks_client, sql_corrector: SQLCorrector):
+    def __init__(self, databricks_client, sql_corrector: SQLCorrector, max_candidates: int = 3):
         """
         Initialize retryable query executor.
         
         Args:
             databricks_client: Databricks client for query execution
             sql_corrector: SQLCorrector instance
+            max_candidates: Corrections tried concurrently per retry
         """
         self.databricks_client = databricks_client
         self.sql_corrector = sql_corrector
+        self.max_candidates = max_candidates
+        # Only created on first multi-candidate retry when the client has
+        # no long-lived executor of its own to share
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._executor_lock = threading.Lock()
     
     def execute_with_retry(
         self,
@@ -403,6 +737,10 @@ class RetryableQueryExecutor:
         """
         Execute SQL query with automatic retry and correction.
         
+        Each retry runs the top correction candidates concurrently and
+        keeps the first one that succeeds, so several plausible fixes cost
+        one round-trip instead of one each.
+        
         Args:
             sql_query: SQL query to execute
             max_retries: Maximum number of retry attempts
@@ -411,37 +749,103 @@ class RetryableQueryExecutor:
             Tuple of (success, results, correction_log)
         """
         correction_log = []
-        current_query = sql_query
+        candidate_queries = [sql_query]
         
         for attempt in range(max_retries):
-            try:
-                logger.info(f"Executing query (attempt {attempt + 1}/{max_retries})")
-                results = self.databricks_client.execute_query(current_query)
-                
+            logger.info(f"Executing query (attempt {attempt + 1}/{max_retries})")
+            results, failed_query, error_message = self._execute_first_success(candidate_queries)
+            
+            if error_message is None:
                 if attempt > 0:
                     correction_log.append(f"✅ Query succeeded after {attempt} correction(s)")
                 
                 return True, results, correction_log
-                
-            except Exception as e:
-                error_message = str(e)
-                logger.warning(f"Query failed: {error_message}")
-                
-                correction_log.append(f"❌ Attempt {attempt + 1} failed: {error_message[:100]}")
-                
-                # Try to correct the query
-                correction = self.sql_corrector.correct_query(current_query, error_message)
-                
-                if correction and attempt < max_retries - 1:
+            
+            logger.warning(f"Query failed: {error_message}")
+            
+            correction_log.append(f"❌ Attempt {attempt + 1} failed: {error_message[:100]}")
+            
+            # Try to correct the query
+            corrections = self.sql_corrector.correct_query_candidates(
+                failed_query, error_message, top_k=self.max_candidates
+            )
+            
+            if corrections and attempt < max_retries - 1:
+                action = "Applied" if len(corrections) == 1 else "Trying"
+                for correction in corrections:
                     logger.info(f"Attempting correction: {correction.correction_type}")
                     correction_log.append(
-                        f"🔧 Applied correction: {correction.correction_type} "
+                        f"🔧 {action} correction: {correction.correction_type} "
                         f"(confidence: {correction.confidence:.1%})"
                     )
-                    current_query = correction.corrected_sql
-                else:
-                    # Can't correct or out of retries
-                    correction_log.append("❌ Unable to correct query")
-                    return False, None, correction_log
+                candidate_queries = [correction.corrected_sql for correction in corrections]
+            else:
+                # Can't correct or out of retries
+                correction_log.append("❌ Unable to correct query")
+                return False, None, correction_log
         
         return False, None, correction_log
+    
+    def _execute_first_success(
+        self,
+        queries: List[str]
+    ) -> Tuple[Optional[List[Dict]], str, Optional[str]]:
+        """
+        Run candidate queries concurrently and return the first success.
+        
+        Args:
+            queries: Candidate queries, most confident first
+            
+        Returns:
+            Tuple of (results, query, error_message). error_message is None
+            on success; when every query fails it is the error of the most
+            confident candidate, which is also the query returned.
+        """
+        if len(queries) == 1:
+            try:
+                return self.databricks_client.execute_query(queries[0]), queries[0], None
+            except Exception as e:
+                return None, queries[0], str(e)
+        
+        executor = self._get_executor()
+        futures = {
+            executor.submit(self.databricks_client.execute_query, query): index
+            for index, query in enumerate(queries)
+        }
+        errors: Dict[int, str] = {}
+        pending = set(futures)
+        
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index = futures[future]
+                try:
+                    results = future.result()
+                except Exception as e:
+                    errors[index] = str(e)
+                    continue
+                
+                # Statements already running on the warehouse cannot be
+                # recalled; only those still queued are dropped
+                for other in pending:
+                    other.cancel()
+                return results, queries[index], None
+        
+        return None, queries[0], errors[0]
+    
+    def _get_executor(self) -> Executor:
+        """Return the client's shared executor, or create a candidate pool on first use."""
+        # The client's pool is sized to its connection pool and is shut
+        # down with it, so candidates don't hold threads of their own
+        shared_executor = getattr(self.databricks_client, 'executor', None)
+        executor = shared_executor() if callable(shared_executor) else None
+        if isinstance(executor, Executor):
+            return executor
+        
+        with self._executor_lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_candidates,
+                    thread_name_prefix="sql-retry"
+                )
+            return self._executor
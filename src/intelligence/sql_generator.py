@@ -4,19 +4,89 @@ Generates safe SQL queries from known schema without hallucinating columns.
 """
 
 import logging
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from typing import Dict, Iterator, List, Mapping, Optional, Any, Sequence, Tuple, Union
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
 class TableSchema:
-    """Represents a table schema."""
-    name: str
-    columns: List[str]
-    column_types: Dict[str, str]
-    description: Optional[str] = None
+    """
+    Represents a table schema.
+    
+    Column names and types are stored as two parallel tuples rather than a
+    list plus a dict repeating every name. The ``columns`` and
+    ``column_types`` views are built on first access and then reused, so
+    treat them as read-only. A plain class with ``__slots__`` instead of a
+    dataclass, since the constructor accepts either form of column types
+    and so can't mirror the stored fields.
+    """
+    
+    __slots__ = ('name', 'column_names', 'column_type_names', 'description', '_columns', '_column_types')
+    
+    def __init__(
+        self,
+        name: str,
+        columns: Sequence[str],
+        column_types: Union[Mapping[str, str], Sequence[str]],
+        description: Optional[str] = None
+    ):
+        """
+        Initialize a table schema.
+        
+        Args:
+            name: Table name
+            columns: Column names in table order
+            column_types: Mapping of column name to type, or a sequence of
+                types parallel to columns
+            description: Optional table description
+        """
+        self.name = name
+        self.column_names: Tuple[str, ...] = tuple(columns)
+        if isinstance(column_types, Mapping):
+            self.column_type_names: Tuple[Optional[str], ...] = tuple(
+                column_types.get(col) for col in self.column_names
+            )
+        else:
+            self.column_type_names = tuple(column_types)
+        self.description = description
+        self._columns: Optional[List[str]] = None
+        self._column_types: Optional[Dict[str, str]] = None
+    
+    def __repr__(self) -> str:
+        return (
+            f"TableSchema(name={self.name!r}, column_names={self.column_names!r}, "
+            f"column_type_names={self.column_type_names!r}, description={self.description!r})"
+        )
+    
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, TableSchema):
+            return NotImplemented
+        return (
+            (self.name, self.column_names, self.column_type_names, self.description)
+            == (other.name, other.column_names, other.column_type_names, other.description)
+        )
+    
+    @property
+    def columns(self) -> List[str]:
+        """Column names in table order."""
+        if self._columns is None:
+            self._columns = list(self.column_names)
+        return self._columns
+    
+    @property
+    def column_types(self) -> Dict[str, str]:
+        """Mapping of column name to type for columns with a known type."""
+        if self._column_types is None:
+            self._column_types = {
+                col: col_type
+                for col, col_type in zip(self.column_names, self.column_type_names)
+                if col_type is not None
+            }
+        return self._column_types
+    
+    def typed_columns(self) -> Iterator[Tuple[str, Optional[str]]]:
+        """Iterate (column name, type or None) pairs without building a dict."""
+        return zip(self.column_names, self.column_type_names)
 
 
 class SchemaManager:
@@ -24,10 +94,18 @@ class SchemaManager:
     
     def __init__(self):
         self.tables: Dict[str, TableSchema] = {}
+        # Bumped on every change so callers can key caches on the schema
+        self.schema_version = 0
+        # Lowercased name caches for fuzzy matching, built lazily
+        self._tables_lower: Optional[Tuple[str, ...]] = None
+        self._columns_lower: Dict[str, Tuple[str, ...]] = {}
     
     def add_table(self, table: TableSchema):
         """Add a table schema."""
         self.tables[table.name] = table
+        self.schema_version += 1
+        self._tables_lower = None
+        self._columns_lower.pop(table.name, None)
         logger.info(f"Added table schema: {table.name}")
     
     def get_table(self, table_name: str) -> Optional[TableSchema]:
@@ -43,12 +121,33 @@ class SchemaManager:
         table = self.get_table(table_name)
         return table.columns if table else None
     
+    def as_columns_dict(self) -> Dict[str, List[str]]:
+        """Map every table name to its column list in a single pass."""
+        return {name: list(table.column_names) for name, table in self.tables.items()}
+    
+    def get_all_tables_lower(self) -> Tuple[str, ...]:
+        """Get lowercased table names, index-parallel to get_all_tables()."""
+        if self._tables_lower is None:
+            self._tables_lower = tuple(name.lower() for name in self.tables)
+        return self._tables_lower
+    
+    def get_table_columns_lower(self, table_name: str) -> Optional[Tuple[str, ...]]:
+        """Get lowercased columns, index-parallel to get_table_columns()."""
+        columns_lower = self._columns_lower.get(table_name)
+        if columns_lower is None:
+            table = self.get_table(table_name)
+            if not table:
+                return None
+            columns_lower = tuple(col.lower() for col in table.column_names)
+            self._columns_lower[table_name] = columns_lower
+        return columns_lower
+    
     def column_exists(self, table_name: str, column_name: str) -> bool:
         """Check if a column exists in a table."""
         table = self.get_table(table_name)
         if not table:
             return False
-        return column_name in table.columns
+        return column_name in table.column_names
     
     def get_schema_summary(self) -> str:
         """Get a human-readable summary of the schema."""
@@ -61,9 +160,8 @@ class SchemaManager:
             if table.description:
                 summary += f"  Description: {table.description}\n"
             summary += "  Columns:\n"
-            for col in table.columns:
-                col_type = table.column_types.get(col, "unknown")
-                summary += f"    - {col} ({col_type})\n"
+            for col, col_type in table.typed_columns():
+                summary += f"    - {col} ({col_type or 'unknown'})\n"
         return summary
 
 
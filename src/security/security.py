@@ -4,8 +4,11 @@ Implements input validation, SQL injection prevention, and access control.
 """
 
 import re
+import threading
+import time
+from array import array
 import sqlparse
-from typing import List, Optional, Set
+from typing import Dict, List, Optional, Set
 from pydantic import BaseModel, validator
 import logging
 
@@ -202,11 +205,25 @@ class SchemaValidator:
 
 
 class RateLimiter:
-    """Simple in-memory rate limiter for API calls."""
+    """
+    Simple in-memory rate limiter for API calls.
+    
+    Each user's calls are counted in a ring of 60 one-second buckets on the
+    monotonic clock, with a running total of the ring, so a check costs the
+    same however many calls were made in the last minute. Users idle for a
+    whole window are dropped by a sweep that runs at most once per window,
+    so one-off user ids (e.g. per-session ids) don't accumulate.
+    """
+    
+    WINDOW_SECONDS = 60
     
     def __init__(self, max_calls_per_minute: int):
         self.max_calls = max_calls_per_minute
-        self.calls = []
+        self._buckets: Dict[str, array] = {}
+        self._totals: Dict[str, int] = {}
+        self._last_seen: Dict[str, int] = {}
+        self._next_sweep = int(time.monotonic()) + self.WINDOW_SECONDS
+        self._lock = threading.Lock()
     
     def check_rate_limit(self, user_id: str = "default") -> tuple[bool, Optional[str]]:
         """
@@ -218,22 +235,46 @@ class RateLimiter:
         Returns:
             Tuple of (is_allowed, error_message)
         """
-        import time
-        current_time = time.time()
-        
-        # Remove calls older than 1 minute
-        self.calls = [
-            (uid, timestamp) 
-            for uid, timestamp in self.calls 
-            if current_time - timestamp < 60
-        ]
+        now = int(time.monotonic())
         
-        # Count calls for this user in the last minute
-        user_calls = sum(1 for uid, _ in self.calls if uid == user_id)
-        
-        if user_calls >= self.max_calls:
-            return False, f"Rate limit exceeded. Maximum {self.max_calls} calls per minute."
-        
-        # Record this call
-        self.calls.append((user_id, current_time))
-        return True, None
+        with self._lock:
+            if now >= self._next_sweep:
+                self._evict_idle(now)
+            
+            buckets = self._buckets.get(user_id)
+            if buckets is None:
+                buckets = self._buckets[user_id] = array('I', bytes(4 * self.WINDOW_SECONDS))
+                total = 0
+            else:
+                total = self._totals[user_id]
+                last_seen = self._last_seen[user_id]
+                if now - last_seen >= self.WINDOW_SECONDS:
+                    # Everything in the ring is older than a minute
+                    buckets[:] = array('I', bytes(4 * self.WINDOW_SECONDS))
+                    total = 0
+                else:
+                    # Expire the seconds that passed since the last call
+                    for second in range(last_seen + 1, now + 1):
+                        slot = second % self.WINDOW_SECONDS
+                        total -= buckets[slot]
+                        buckets[slot] = 0
+            self._last_seen[user_id] = now
+            
+            if total >= self.max_calls:
+                self._totals[user_id] = total
+                return False, f"Rate limit exceeded. Maximum {self.max_calls} calls per minute."
+            
+            # Record this call
+            buckets[now % self.WINDOW_SECONDS] += 1
+            self._totals[user_id] = total + 1
+            return True, None
+    
+    def _evict_idle(self, now: int):
+        """Forget users whose whole ring has expired; caller holds the lock."""
+        idle = [
+            user_id for user_id, last_seen in self._last_seen.items()
+            if now - last_seen >= self.WINDOW_SECONDS
+        ]
+        for user_id in idle:
+            del self._buckets[user_id], self._totals[user_id], self._last_seen[user_id]
+        self._next_sweep = now + self.WINDOW_SECONDS
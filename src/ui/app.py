@@ -3,23 +3,24 @@ Streamlit UI for Databricks Insight Agent.
 Provides an interactive chat-style interface for querying Databricks data.
 """
 
+import atexit
+import hashlib
+import json
 import os
+import pathlib
 import sys
+import uuid
 import streamlit as st
 import logging
 from dotenv import load_dotenv
 from datetime import datetime
+from string import Template
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from src.data.databricks_client import DatabricksClient
-from src.intelligence.sql_generator import SchemaManager, SQLGenerator, TableSchema
-from src.intelligence.schema_loader import SchemaLoader, create_schema_manager_from_databricks
-from src.intelligence.context_retriever import ContextRetriever
-from src.intelligence.document_processor import create_knowledge_base_documents
-from src.security.security import SecurityValidator, SecurityConfig, SchemaValidator, RateLimiter
-from src.core.agent import DatabricksInsightAgent, QueryType
+# The agent stack (databricks-sql, faiss, sentence-transformers, pyarrow) is
+# imported where it's first used, so the page header paints before it loads
 
 
 # Page configuration
@@ -30,60 +31,52 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for better styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #FF3621;
-        margin-bottom: 0.5rem;
-    }
-    .sub-header {
-        font-size: 1.2rem;
-        color: #666;
-        margin-bottom: 2rem;
-    }
-    .query-card {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    .result-card {
-        background-color: #e8f4f8;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        margin-bottom: 1rem;
-    }
-    .sql-code {
-        background-color: #282c34;
-        color: #abb2bf;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        font-family: 'Courier New', monospace;
-        margin: 1rem 0;
-    }
-    .insight-box {
-        background-color: #f0f9ff;
-        border-left: 4px solid #0284c7;
-        padding: 1rem;
-        margin: 1rem 0;
-    }
-    .context-box {
-        background-color: #fef3c7;
-        border-left: 4px solid #f59e0b;
-        padding: 1rem;
-        margin: 1rem 0;
-    }
-    .error-box {
-        background-color: #fee2e2;
-        border-left: 4px solid #dc2626;
-        padding: 1rem;
-        margin: 1rem 0;
-    }
-</style>
-""", unsafe_allow_html=True)
+
+@st.cache_data(show_spinner=False)
+def _css():
+    """Stylesheet for the app; read from disk once, not on every rerun."""
+    return pathlib.Path(__file__).with_name("styles.css").read_text()
+
+
+# Custom CSS for better styling; Streamlit clears the page on every rerun,
+# so the (cached) sheet is re-sent each time
+if hasattr(st, "html"):
+    st.html(f"<style>{_css()}</style>")
+else:
+    st.markdown(f"<style>{_css()}</style>", unsafe_allow_html=True)
+
+# Message box markup; values are substituted, never parsed as a template
+INSIGHT_BOX = Template('<div class="insight-box">$body</div>')
+CONTEXT_BOX = Template('<div class="context-box">$body</div>')
+ERROR_BOX = Template('<div class="error-box"><strong>Error:</strong> $body</div>')
+
+
+# Sidebar panels rerun on their own when their widgets change; Streamlit
+# releases before st.fragment (1.37) just render them inline
+_fragment = getattr(st, "fragment", None) or getattr(st, "experimental_fragment", None) or (lambda func: func)
+
+EXAMPLE_QUERIES = (
+    "Show me total sales by region",
+    "What are the top 5 products by revenue?",
+    "How many customers registered last month?",
+    "What is the average order value?",
+    "Show sales trends over time"
+)
+
+# Results up to this many rows render as a static table; larger ones get
+# the interactive grid
+STATIC_TABLE_MAX_ROWS = 100
+
+# Status labels for the agent's ProcessingStage values
+STAGE_LABELS = {
+    "analyzing": "🔎 Understanding your question...",
+    "generating_sql": "🧠 Generating SQL...",
+    "executing": "⚙️ Executing on Databricks...",
+    "summarizing": "📝 Summarizing results...",
+}
+
+# Number of chat messages rendered per rerun; older ones load on request
+CHAT_WINDOW = 20
 
 
 def setup_logging():
@@ -102,10 +95,20 @@ def initialize_session_state():
         st.session_state.agent = None
     if 'initialized' not in st.session_state:
         st.session_state.initialized = False
+    if 'session_id' not in st.session_state:
+        # The agent is shared by every browser session, so rate limits and
+        # cached responses are keyed on this id rather than a constant user
+        st.session_state.session_id = uuid.uuid4().hex
 
 
+@st.cache_data(ttl="15m", show_spinner=False)
 def load_configuration():
-    """Load configuration from environment variables."""
+    """
+    Load configuration from environment variables.
+    
+    Cached so reruns don't re-read .env; changes are picked up within 15
+    minutes.
+    """
     load_dotenv()
     
     config = {
@@ -116,6 +119,7 @@ def load_configuration():
         'schema': os.getenv('DATABRICKS_SCHEMA', 'default'),
         'mistral_api_key': os.getenv('MISTRAL_API_KEY'),
         'mistral_model': os.getenv('MISTRAL_MODEL', 'mistral-large-latest'),
+        'max_concurrent_llm': int(os.getenv('MISTRAL_MAX_CONCURRENT_REQUESTS', '4')),
         'faiss_index_path': os.getenv('FAISS_INDEX_PATH', './data/faiss_index.faiss'),
         'max_query_length': int(os.getenv('MAX_QUERY_LENGTH', '10000')),
         'rate_limit_per_minute': int(os.getenv('RATE_LIMIT_PER_MINUTE', '60')),
@@ -125,159 +129,305 @@ def load_configuration():
     return config
 
 
-def initialize_agent(config, use_sample_data=True):
-    """Initialize the Databricks Insight Agent with all components."""
+@st.cache_data(max_entries=1, show_spinner=False)
+def _kb_documents():
+    """Knowledge base chunks as retriever Documents; the input never changes."""
+    from src.intelligence.context_retriever import Document
+    from src.intelligence.document_processor import create_knowledge_base_documents
+    
+    kb_chunks = create_knowledge_base_documents()
+    return [Document(content=chunk.content, metadata=chunk.metadata) 
+            for chunk in kb_chunks]
+
+
+def _sync_kb_index(context_retriever, documents):
+    """
+    Make the retriever's persisted index hold the current knowledge base.
+    
+    A ``<index_path>.kb`` sidecar records the hash of the knowledge base
+    last written to the index and the ids it was given. When the hash still
+    matches, the index loaded from disk is used as-is and nothing is
+    embedded; when it changed, the old knowledge base documents are
+    swapped for the new ones and the index is saved again.
+    
+    Args:
+        context_retriever: ContextRetriever bound to an index path
+        documents: Knowledge base Documents
+    """
+    index_path = context_retriever.index_path
+    if not index_path:
+        context_retriever.add_documents(documents)
+        return
+    
+    digest = hashlib.sha1()
+    for doc in documents:
+        digest.update(doc.content.encode())
+        digest.update(b"\0")
+    kb_hash = digest.hexdigest()
     
+    sidecar_path = index_path + ".kb"
     try:
-        # Initialize Databricks client
-        if config['databricks_hostname'] and config['databricks_token']:
-            databricks_client = DatabricksClient(
-                server_hostname=config['databricks_hostname'],
-                http_path=config['databricks_http_path'],
-                access_token=config['databricks_token']
-            )
-        else:
-            st.warning("⚠️ Databricks credentials not configured. Using mock mode.")
-            databricks_client = None
-        
-        # Initialize schema manager with auto-detection
-        if databricks_client:
-            # Auto-detect schema from Databricks
-            schema_manager = create_schema_manager_from_databricks(
-                databricks_client=databricks_client,
-                catalog=config.get('catalog', 'hive_metastore'),
-                schema=config.get('schema', 'default'),
-                specific_tables=config.get('specific_tables', None),
-                fallback_to_sample=use_sample_data
-            )
-        else:
-            # Use sample schema when no Databricks connection
-            schema_manager = create_schema_manager_from_databricks(
-                databricks_client=None,
-                fallback_to_sample=True
-            )
-        
-        # Initialize SQL generator
-        sql_generator = SQLGenerator(schema_manager)
-        
-        # Initialize context retriever
-        context_retriever = ContextRetriever(
-            embedding_model="all-MiniLM-L6-v2",
-            index_path=config['faiss_index_path']
-        )
-        
-        # Add sample documents if no index exists
-        if use_sample_data:
-            kb_chunks = create_knowledge_base_documents()
-            from src.intelligence.context_retriever import Document
-            documents = [Document(content=chunk.content, metadata=chunk.metadata) 
-                        for chunk in kb_chunks]
-            context_retriever.add_documents(documents)
+        with open(sidecar_path) as f:
+            sidecar = json.load(f)
+    except (OSError, ValueError):
+        sidecar = {}
+    
+    if context_retriever.index is not None and sidecar.get('hash') == kb_hash:
+        return
+    
+    if context_retriever.index is not None and sidecar.get('ids'):
+        context_retriever.remove_documents(sidecar['ids'])
+    ids = context_retriever.add_documents(documents)
+    context_retriever.save_index()
+    
+    with open(sidecar_path + ".tmp", 'w') as f:
+        json.dump({'hash': kb_hash, 'ids': ids}, f)
+    os.replace(sidecar_path + ".tmp", sidecar_path)
+
+
+def _config_key(config):
+    """Turn a configuration dict into a hashable, order-independent cache key."""
+    return tuple(sorted(
+        (key, tuple(value) if isinstance(value, list) else value)
+        for key, value in config.items()
+    ))
+
+
+def _release_agent(agent):
+    """Close the Databricks connections held by a cached agent."""
+    if agent.databricks_client is not None:
+        agent.databricks_client.disconnect()
+
+
+@st.cache_resource(show_spinner=False)
+def _build_agent(config_key, use_sample_data):
+    """
+    Build the agent once per process and share it across all sessions.
+    
+    The returned agent is a process-wide singleton: callers must treat it
+    as read-only, since a change made for one session is seen by all.
+    Errors propagate so that a failed build is not cached.
+    
+    Args:
+        config_key: Configuration as returned by _config_key
+        use_sample_data: Whether to load the built-in knowledge base
         
-        # Initialize security components
-        security_config = SecurityConfig(
-            max_query_length=config['max_query_length'],
-            rate_limit_per_minute=config['rate_limit_per_minute'],
-            allowed_schemas=config['allowed_schemas']
+    Returns:
+        DatabricksInsightAgent instance
+    """
+    from src.data.databricks_client import DatabricksClient
+    from src.intelligence.sql_generator import SQLGenerator
+    from src.intelligence.schema_loader import create_schema_manager_from_databricks
+    from src.intelligence.context_retriever import ContextRetriever
+    from src.security.security import SecurityValidator, SecurityConfig, SchemaValidator, RateLimiter
+    from src.core.agent import DatabricksInsightAgent, QueryBatcher
+    
+    config = {
+        key: list(value) if isinstance(value, tuple) else value
+        for key, value in config_key
+    }
+    
+    # Initialize Databricks client
+    if config['databricks_hostname'] and config['databricks_token']:
+        databricks_client = DatabricksClient(
+            server_hostname=config['databricks_hostname'],
+            http_path=config['databricks_http_path'],
+            access_token=config['databricks_token']
         )
-        
-        rate_limiter = RateLimiter(max_calls_per_minute=security_config.rate_limit_per_minute)
-        
-        # Build known_tables dictionary for schema validator
-        known_tables = {
-            table_name: schema_manager.get_table_columns(table_name)
-            for table_name in schema_manager.get_all_tables()
-        }
-        schema_validator = SchemaValidator(known_tables)
-        
-        security_validator = SecurityValidator(security_config)
-        
-        # Initialize LLM service (optional)
-        llm_service = None
-        if config.get('mistral_api_key'):
-            try:
-                from src.intelligence.llm_service import create_llm_service
-                llm_service = create_llm_service(
-                    api_key=config['mistral_api_key'],
-                    model=config.get('mistral_model', 'mistral-large-latest')
-                )
-                if llm_service:
-                    st.success("✅ Mistral AI enabled for enhanced query understanding")
-            except Exception as e:
-                st.warning(f"⚠️ Could not initialize Mistral AI: {e}")
-        
-        # Create agent
-        agent = DatabricksInsightAgent(
+    else:
+        st.warning("⚠️ Databricks credentials not configured. Using mock mode.")
+        databricks_client = None
+    
+    # Initialize schema manager with auto-detection
+    if databricks_client:
+        # Auto-detect schema from Databricks
+        schema_manager = create_schema_manager_from_databricks(
             databricks_client=databricks_client,
-            schema_manager=schema_manager,
-            sql_generator=sql_generator,
-            context_retriever=context_retriever,
-            security_validator=security_validator,
-            rate_limiter=rate_limiter,
-            llm_service=llm_service
+            catalog=config.get('catalog', 'hive_metastore'),
+            schema=config.get('schema', 'default'),
+            specific_tables=config.get('specific_tables', None),
+            fallback_to_sample=use_sample_data
         )
-        
-        return agent
+    else:
+        # Use sample schema when no Databricks connection
+        schema_manager = create_schema_manager_from_databricks(
+            databricks_client=None,
+            fallback_to_sample=True
+        )
+    
+    # Initialize SQL generator
+    sql_generator = SQLGenerator(schema_manager)
+    
+    # Initialize context retriever
+    context_retriever = ContextRetriever(
+        embedding_model="all-MiniLM-L6-v2",
+        index_path=config['faiss_index_path']
+    )
+    
+    # Add sample documents unless the saved index already has them
+    if use_sample_data:
+        _sync_kb_index(context_retriever, _kb_documents())
+    
+    # Initialize security components
+    security_config = SecurityConfig(
+        max_query_length=config['max_query_length'],
+        rate_limit_per_minute=config['rate_limit_per_minute'],
+        allowed_schemas=config['allowed_schemas']
+    )
+    
+    rate_limiter = RateLimiter(max_calls_per_minute=security_config.rate_limit_per_minute)
+    
+    # Build known_tables dictionary for schema validator
+    known_tables = schema_manager.as_columns_dict()
+    schema_validator = SchemaValidator(known_tables)
+    
+    security_validator = SecurityValidator(security_config)
+    
+    # Initialize LLM service (optional)
+    llm_service = None
+    if config.get('mistral_api_key'):
+        try:
+            from src.intelligence.llm_service import create_llm_service
+            llm_service = create_llm_service(
+                api_key=config['mistral_api_key'],
+                model=config.get('mistral_model', 'mistral-large-latest'),
+                max_concurrent_requests=config.get('max_concurrent_llm')
+            )
+            if llm_service:
+                st.success("✅ Mistral AI enabled for enhanced query understanding")
+        except Exception as e:
+            st.warning(f"⚠️ Could not initialize Mistral AI: {e}")
+    
+    # Concurrent questions from one session share Mistral SQL generation calls
+    query_batcher = QueryBatcher(llm_service) if llm_service else None
+    
+    # Create agent
+    agent = DatabricksInsightAgent(
+        databricks_client=databricks_client,
+        schema_manager=schema_manager,
+        sql_generator=sql_generator,
+        context_retriever=context_retriever,
+        security_validator=security_validator,
+        rate_limiter=rate_limiter,
+        llm_service=llm_service,
+        query_batcher=query_batcher
+    )
+    
+    # Cached resources live until the process exits
+    atexit.register(_release_agent, agent)
+    
+    return agent
+
+
+def initialize_agent(config, use_sample_data=True):
+    """
+    Initialize the Databricks Insight Agent with all components.
+    
+    The agent is built once per process (see _build_agent); new sessions
+    and browser tabs reuse it.
+    """
+    
+    try:
+        return _build_agent(_config_key(config), use_sample_data)
         
     except Exception as e:
         st.error(f"❌ Failed to initialize agent: {str(e)}")
         return None
 
 
+def _render_connection_status():
+    """Show whether Databricks credentials are configured."""
+    config = load_configuration()
+    
+    # Connection status
+    if config['databricks_hostname']:
+        st.success("✅ Databricks Connected")
+    else:
+        st.warning("⚠️ No Databricks Connection")
+
+
+@_fragment
+def _render_schema_panel():
+    """List the agent's tables and columns."""
+    st.markdown("### 📊 Available Tables")
+    
+    if st.session_state.agent:
+        schema_manager = st.session_state.agent.schema_manager
+        for table_name in schema_manager.get_all_tables():
+            with st.expander(f"📋 {table_name}"):
+                table = schema_manager.get_table(table_name)
+                if table.description:
+                    st.caption(table.description)
+                st.markdown("**Columns:**")
+                for col, col_type in table.typed_columns():
+                    st.text(f"  • {col} ({col_type or 'unknown'})")
+
+
+@_fragment
+def _render_examples():
+    """Render the example-query picker."""
+    st.markdown("### 💡 Example Queries")
+    
+    # Picking an option only reruns this fragment; Run submits it
+    choice = st.selectbox(
+        "Try an example",
+        EXAMPLE_QUERIES,
+        index=None,
+        placeholder="Choose an example query",
+        key="example_choice"
+    )
+    if st.button("▶️ Run example", disabled=choice is None):
+        st.session_state.example_query = choice
+        # The query is answered by the main script, so leave the fragment
+        st.rerun()
+
+
 def render_sidebar():
     """Render the sidebar with configuration and schema information."""
     with st.sidebar:
         st.markdown("### 🔧 Configuration")
         
-        config = load_configuration()
-        
-        # Connection status
-        if config['databricks_hostname']:
-            st.success("✅ Databricks Connected")
-        else:
-            st.warning("⚠️ No Databricks Connection")
+        _render_connection_status()
         
         st.markdown("---")
         
         # Schema information
-        st.markdown("### 📊 Available Tables")
-        
-        if st.session_state.agent:
-            schema_manager = st.session_state.agent.schema_manager
-            for table_name in schema_manager.get_all_tables():
-                with st.expander(f"📋 {table_name}"):
-                    table = schema_manager.get_table(table_name)
-                    if table.description:
-                        st.caption(table.description)
-                    st.markdown("**Columns:**")
-                    for col in table.columns:
-                        col_type = table.column_types.get(col, "unknown")
-                        st.text(f"  • {col} ({col_type})")
+        _render_schema_panel()
         
         st.markdown("---")
         
         # Query examples
-        st.markdown("### 💡 Example Queries")
-        example_queries = [
-            "Show me total sales by region",
-            "What are the top 5 products by revenue?",
-            "How many customers registered last month?",
-            "What is the average order value?",
-            "Show sales trends over time"
-        ]
-        
-        for query in example_queries:
-            if st.button(query, key=f"example_{query}"):
-                st.session_state.example_query = query
+        _render_examples()
         
         st.markdown("---")
         
         # Clear chat button
         if st.button("🗑️ Clear Chat History"):
             st.session_state.messages = []
+            st.session_state.pop('chat_window_start', None)
             st.rerun()
 
 
+def _results_table(results):
+    """
+    Convert query results to an Arrow table, once, when a message is stored.
+    
+    Args:
+        results: Result rows as a list of dicts
+        
+    Returns:
+        pyarrow Table, or None if the rows don't fit a columnar schema
+        (e.g. a column mixing numbers and strings)
+    """
+    import pyarrow as pa
+    
+    try:
+        return pa.Table.from_pylist(results)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        logging.getLogger(__name__).warning(f"Could not convert results to Arrow: {e}")
+        return None
+
+
 def render_message(message):
     """Render a chat message with proper formatting."""
     
@@ -290,7 +440,7 @@ def render_message(message):
         with st.chat_message("assistant"):
             # Display the main insight
             if "insights" in message:
-                st.markdown(f'<div class="insight-box">{message["insights"]}</div>', 
+                st.markdown(INSIGHT_BOX.substitute(body=message["insights"]), 
                           unsafe_allow_html=True)
             
             # Display SQL query if available
@@ -301,19 +451,25 @@ def render_message(message):
             # Display query results if available
             if message.get("results"):
                 with st.expander("📊 View Query Results"):
-                    import pandas as pd
-                    df = pd.DataFrame(message["results"])
-                    st.dataframe(df, use_container_width=True)
+                    # Streamlit takes Arrow tables as-is; the row dicts are
+                    # only a fallback for results Arrow couldn't type
+                    data = message.get("results_arrow")
+                    if data is None:
+                        data = message["results"]
+                    if len(message["results"]) <= STATIC_TABLE_MAX_ROWS:
+                        st.table(data)
+                    else:
+                        st.dataframe(data, use_container_width=True)
             
             # Display retrieved context if available
             if message.get("context"):
                 with st.expander("📚 View Retrieved Context"):
-                    st.markdown(f'<div class="context-box">{message["context"]}</div>', 
+                    st.markdown(CONTEXT_BOX.substitute(body=message["context"]), 
                               unsafe_allow_html=True)
             
             # Display error if any
             if message.get("error"):
-                st.markdown(f'<div class="error-box"><strong>Error:</strong> {message["error"]}</div>', 
+                st.markdown(ERROR_BOX.substitute(body=message["error"]), 
                           unsafe_allow_html=True)
             
             # Display clarification needed
@@ -350,8 +506,14 @@ def main():
     # Render sidebar
     render_sidebar()
     
-    # Display chat history
-    for message in st.session_state.messages:
+    # Display the most recent part of the chat history
+    messages = st.session_state.messages
+    start = st.session_state.get('chat_window_start', max(0, len(messages) - CHAT_WINDOW))
+    if start > 0:
+        if st.button(f"⬆️ Load {min(CHAT_WINDOW, start)} older messages"):
+            st.session_state.chat_window_start = max(0, start - CHAT_WINDOW)
+            st.rerun()
+    for message in messages[start:]:
         render_message(message)
     
     # Handle example query selection
@@ -363,6 +525,15 @@ def main():
     
     # Process new query
     if user_query:
+        # Reject over-limit queries before anything is recorded or sent to
+        # the agent; the agent is then told not to count the query again
+        agent = st.session_state.agent
+        if agent.rate_limiter:
+            rate_ok, rate_msg = agent.rate_limiter.check_rate_limit(st.session_state.session_id)
+            if not rate_ok:
+                st.warning(f"⏳ {rate_msg}")
+                st.stop()
+        
         # Add user message
         st.session_state.messages.append({
             "role": "user",
@@ -375,8 +546,27 @@ def main():
         
         # Process query with agent
         with st.chat_message("assistant"):
-            with st.spinner("🤔 Analyzing query..."):
-                response = st.session_state.agent.process_query(user_query, user_id="streamlit_user")
+            with st.status("🤔 Analyzing query...", expanded=False) as status:
+                def show_stage(stage):
+                    label = STAGE_LABELS[stage.value]
+                    status.update(label=label)
+                    status.write(label)
+                
+                # The sync pipeline runs on the script thread, which is the only
+                # one allowed to update st.status; each stage is sent to the
+                # browser as it starts. aprocess_query would need an event loop
+                # per rerun, and the shared agent's async Mistral client can't
+                # outlive the loop it was first used on
+                response = agent.process_query(
+                    user_query,
+                    user_id=st.session_state.session_id,
+                    skip_rate_limit=True,
+                    on_progress=show_stage
+                )
+                if response.error:
+                    status.update(label="⚠️ Could not complete the query", state="error")
+                else:
+                    status.update(label="✅ Done", state="complete")
             
             # Create response message
             response_message = {
@@ -385,6 +575,7 @@ def main():
                 "insights": response.insights,
                 "sql_query": response.sql_query,
                 "results": response.results,
+                "results_arrow": _results_table(response.results) if response.results else None,
                 "context": response.context,
                 "error": response.error,
                 "clarification_needed": response.clarification_needed
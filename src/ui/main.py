@@ -133,10 +133,7 @@ def initialize_agent(config: dict, demo_mode: bool = False):
     security_validator.check_rate_limit = security_validator.rate_limiter.check_rate_limit
     
     # Initialize schema validator
-    known_tables = {
-        table_name: schema_manager.get_table_columns(table_name)
-        for table_name in schema_manager.get_all_tables()
-    }
+    known_tables = schema_manager.as_columns_dict()
     schema_validator = SchemaValidator(known_tables)
     
     # Initialize context retriever
@@ -144,7 +141,7 @@ def initialize_agent(config: dict, demo_mode: bool = False):
         context_retriever = ContextRetriever(index_path=config['faiss_index_path'])
         
         # Add sample documents if index is empty
-        if len(context_retriever.documents) == 0:
+        if context_retriever.document_count == 0:
             logger.info("Initializing context with sample documents")
             sample_docs = create_sample_documents()
             context_retriever.add_documents(sample_docs)